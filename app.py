@@ -1,24 +1,53 @@
-import os
+import asyncio
+import hashlib
+import json
 import logging
-from flask import Flask, request, jsonify
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask, Response, request
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from telegram import Update
+
+# Configure logging before importing the bot modules
+from logging_setup import configure
+configure()
+
+from bot_common import ALLOWED_UPDATES, POLL_TIMEOUT, PUBLIC_URL, WEBHOOK_SECRET
 from bot_handlers_spanish import setup_bot
+from config import cached_env
 
-# Configure logging (if not already configured)
-if not logging.getLogger().handlers:
-    logging.basicConfig(level=logging.DEBUG, 
-                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Launch mode, read once at import time
+_WORKFLOW_NAME = cached_env("WORKFLOW_NAME")
+_BOT_ONLY_MODE = cached_env("BOT_ONLY_MODE") == "1"
+_FLASK_DEBUG = cached_env("FLASK_DEBUG") == "1"
+
+# Webhook mode is used when a public base URL is configured; otherwise the bot
+# falls back to long polling (e.g. for local development)
+_USE_WEBHOOK = bool(PUBLIC_URL)
+
 # Create Flask application
 app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "fallback_secret_key_for_development")
+app.secret_key = cached_env("SESSION_SECRET", "fallback_secret_key_for_development")
 
-# Global variable to store the bot updater
+# Global variable to store the running bot application
 bot_updater = None
+# Event loop the bot runs on; webhook requests are handled in worker threads
+_bot_loop = None
+# Whether an ASGI server ran the lifespan startup, the only place the bot is
+# started, and whether the web app has warned that it is served without it
+_lifespan_started = False
+_warned_bot_not_started = False
+_BOT_NOT_STARTED_MSG = (
+    "The Telegram bot is not running in this process: it is only started through "
+    "the ASGI lifespan (e.g. `hypercorn main:asgi_app`). WSGI servers such as "
+    "`gunicorn main:app`, and the FLASK_DEBUG=1 dev server, serve the web app alone."
+)
 
-@app.route('/')
-def index():
-    return """
+# Landing page, encoded once at import time. The ETag lets browsers revalidate
+# with a conditional GET and receive a 304 instead of the full page.
+_INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -99,69 +128,142 @@ def index():
         </div>
     </body>
     </html>
-    """
+    """.encode("utf-8")
+_INDEX_ETAG = hashlib.md5(_INDEX_HTML).hexdigest()
+
+@app.before_request
+def _warn_if_bot_not_started():
+    """Warn once if the web app is served without the lifespan that starts the bot."""
+    global _warned_bot_not_started
+    if _lifespan_started or _warned_bot_not_started:
+        return
+    _warned_bot_not_started = True
+    if _WORKFLOW_NAME != "bot_app" and not _BOT_ONLY_MODE:
+        logger.warning(_BOT_NOT_STARTED_MSG)
+
+@app.route('/')
+def index():
+    response = Response(_INDEX_HTML, mimetype="text/html")
+    response.set_etag(_INDEX_ETAG)
+    return response.make_conditional(request)
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """
     Webhook endpoint for Telegram updates.
-    This is only used if webhook mode is enabled. Currently using polling mode.
+    Updates are handed to the running bot application's update queue.
     """
-    return "Webhook mode not enabled. Bot is running in polling mode."
+    if not bot_updater or not _USE_WEBHOOK:
+        return "Webhook mode not enabled.", 404
+    
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return "Forbidden", 403
+    
+    update = Update.de_json(request.get_json(force=True), bot_updater.bot)
+    asyncio.run_coroutine_threadsafe(bot_updater.update_queue.put(update), _bot_loop)
+    return "", 200
+
+# /status bodies, encoded once since the mode is fixed at import time
+_STATUS_RUNNING = json.dumps(
+    {"status": "running", "mode": "webhook" if _USE_WEBHOOK else "polling"},
+    separators=(",", ":"),
+).encode("utf-8")
+_STATUS_STOPPED = b'{"status":"not_running"}'
 
 @app.route('/status')
 def status():
     """Return the status of the bot."""
-    global bot_updater
-    
-    if bot_updater:
-        return jsonify({
-            "status": "running",
-            "mode": "polling"
-        })
-    else:
-        return jsonify({
-            "status": "not_running"
-        })
-
-# Initialize the bot on startup in a background thread
-def start_bot():
-    global bot_updater
+    return Response(_STATUS_RUNNING if bot_updater else _STATUS_STOPPED, mimetype="application/json")
+
+# Start the bot on the running event loop, alongside the web server
+async def start_bot():
+    global bot_updater, _bot_loop
     
     # If bot is already running, don't start it again
     if bot_updater:
         return
     
-    # When running in the bot_app workflow or BOT_ONLY_MODE is set, don't start the bot in a separate thread
-    # as it will be managed directly by bot_main.py
-    if os.environ.get("WORKFLOW_NAME") == "bot_app" or os.environ.get("BOT_ONLY_MODE") == "1":
-        logger.info("Bot is managed by a dedicated process, skipping thread creation")
+    # When running in the bot_app workflow or BOT_ONLY_MODE is set, don't start the bot here
+    # as it will be managed directly by cli.py
+    if _WORKFLOW_NAME == "bot_app" or _BOT_ONLY_MODE:
+        logger.info("Bot is managed by a dedicated process, skipping bot startup")
         return
     
-    logger.info("Starting the Telegram bot in polling mode...")
+    mode = "webhook" if _USE_WEBHOOK else "polling"
+    logger.info(f"Starting the Telegram bot in {mode} mode...")
     try:
-        # Start the bot in a separate thread
-        import threading
-        
-        def run_bot():
-            global bot_updater
-            bot_updater = setup_bot()
-            logger.info("Bot started successfully")
-        
-        bot_thread = threading.Thread(target=run_bot)
-        bot_thread.daemon = True
-        bot_thread.start()
+        application = setup_bot()
+        await application.initialize()
+        if _USE_WEBHOOK:
+            # Telegram pushes updates to /webhook instead of being polled
+            await application.bot.set_webhook(
+                url=PUBLIC_URL.rstrip("/") + "/webhook",
+                allowed_updates=ALLOWED_UPDATES,
+                max_connections=40,
+                secret_token=WEBHOOK_SECRET,
+            )
+        await application.start()
+        if not _USE_WEBHOOK:
+            await application.updater.start_polling(timeout=POLL_TIMEOUT, allowed_updates=ALLOWED_UPDATES)
+        _bot_loop = asyncio.get_running_loop()
+        bot_updater = application
+        logger.info("Bot started successfully")
     except Exception as e:
         logger.error(f"Failed to start bot: {e}")
 
+async def stop_bot():
+    global bot_updater
+    
+    if not bot_updater:
+        return
+    
+    application = bot_updater
+    bot_updater = None
+    if application.updater.running:
+        await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    logger.info("Bot stopped")
+
+# Flask runs inside the ASGI server's event loop through this adapter
+_flask_asgi = WsgiToAsgi(app)
+
+async def asgi_app(scope, receive, send):
+    """
+    ASGI entry point serving the Flask app.
+    The bot is started and stopped with the server through the lifespan protocol,
+    so both share a single event loop (e.g. `hypercorn main:asgi_app`).
+    """
+    global _lifespan_started
+    if scope["type"] != "lifespan":
+        await _flask_asgi(scope, receive, send)
+        return
+    
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            _lifespan_started = True
+            await start_bot()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await stop_bot()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
 # Function to start the Flask app
 def start_web_app():
-    app.run(host="0.0.0.0", port=5000, debug=True)
-
-# Register the function to run before the first request
-with app.app_context():
-    start_bot()
+    global _warned_bot_not_started
+    # The Werkzeug dev server (with the reloader) is only for local debugging;
+    # it does not run the lifespan hook, so the bot is not started in this mode
+    if _FLASK_DEBUG:
+        logger.warning(_BOT_NOT_STARTED_MSG)
+        _warned_bot_not_started = True
+        app.run(host="0.0.0.0", port=5000, debug=True)
+        return
+    
+    config = Config()
+    config.bind = ["0.0.0.0:5000"]
+    asyncio.run(serve(asgi_app, config))
 
 if __name__ == "__main__":
-    # Only start the bot if running directly
     start_web_app()
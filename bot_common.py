@@ -0,0 +1,317 @@
+"""
+Language-independent helpers shared by the bot handler modules.
+Anything shown to users is passed in by the handler modules, which keep their own texts.
+"""
+import logging
+import re
+from typing import Collection, Iterable, Iterator, NamedTuple, Optional
+from telegram import InlineKeyboardMarkup, Update
+from telegram.ext import Application, ContextTypes
+from cache import TTLCache
+from config import cached_env
+
+logger = logging.getLogger(__name__)
+
+# Long-polling settings: each getUpdates call is held open by Telegram for up to
+# POLL_TIMEOUT seconds and returns as soon as updates arrive (up to 100 per batch),
+# so an idle bot makes one request per POLL_TIMEOUT instead of spinning.
+POLL_TIMEOUT = 50
+
+# Only ask Telegram for the update types the handlers consume; chat member
+# updates are only delivered when requested and keep the admin cache in sync
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.CHAT_MEMBER]
+
+# Webhook mode, used by run_bot and by app.py's /webhook endpoint when a public
+# base URL is configured
+PUBLIC_URL = cached_env("PUBLIC_URL")
+WEBHOOK_SECRET = cached_env("WEBHOOK_SECRET")
+WEBHOOK_PORT = int(cached_env("PORT", "8443"))
+
+class RatingTexts(NamedTuple):
+    """Texts of a ratings overview, in one language."""
+    # Formatted with list_name
+    header: str
+    # Formatted with item_name and mean, the item's average rating
+    rated: str
+    # Formatted with item_name
+    unrated: str
+
+def rating_lines(list_name: str, items: dict, texts: RatingTexts) -> Iterator[str]:
+    """
+    Yield the lines of the ratings overview for a list, one at a time.
+
+    Args:
+        list_name: Name of the list
+        items: Item names mapped to their ratings
+        texts: Texts of the overview
+
+    Yields:
+        str: The next line, ending with a newline
+    """
+    yield texts.header.format(list_name=list_name)
+    for item_name, ratings in items.items():
+        if ratings:
+            # The running average is kept with the ratings
+            yield texts.rated.format(item_name=item_name, mean=ratings.mean())
+
+            # Show each rating with its comment if available
+            for i, (rating, comment) in enumerate(ratings, 1):
+                if comment:
+                    yield f"    {i}. {rating}/10 - \"{comment}\"\n"
+                else:
+                    yield f"    {i}. {rating}/10\n"
+            yield "\n"
+        else:
+            yield texts.unrated.format(item_name=item_name)
+
+def paginate(lines: Iterable[str], limit: int, max_pages: int, truncated_note: str) -> list[str]:
+    """
+    Pack lines into messages of at most `limit` characters.
+    Stops consuming `lines` after `max_pages` messages, so the work done is
+    bounded no matter how many lines there are.
+
+    Args:
+        lines: Lines of the reply, in order
+        limit: Maximum length of one message
+        max_pages: Maximum number of messages
+        truncated_note: Text appended to the last message when lines are left over
+
+    Returns:
+        list[str]: The messages, at least one if there were any lines
+    """
+    pages = []
+    parts = []
+    total = 0
+    for line in lines:
+        if total + len(line) > limit:
+            if parts:
+                pages.append("".join(parts))
+                parts = []
+                total = 0
+            if len(pages) == max_pages:
+                pages[-1] += truncated_note
+                return pages
+            # A single line can only be this long because of a huge comment
+            line = line[:limit]
+        parts.append(line)
+        total += len(line)
+    if parts:
+        pages.append("".join(parts))
+    return pages
+
+# Callback data tokens: buttons carry a short per-chat number instead of the
+# list or item name, keeping callback_data well under Telegram's 64-byte limit.
+# Each chat keeps only the MAX_CALLBACK_TOKENS most recently shown names; a
+# button whose token has been dropped since reports its menu as expired.
+# Handler modules must page their menus and give tokens only to the page on
+# screen, so a single menu can never evict its own buttons.
+MAX_CALLBACK_TOKENS = 500
+
+def name_token(context: ContextTypes.DEFAULT_TYPE, name: str) -> int:
+    """
+    Get the callback token for a list or item name, assigning one if needed.
+    Tokens are never reused within a chat, so a button in an old menu either
+    still maps to its own name or to nothing at all.
+
+    Args:
+        context: The context object
+        name: List or item name shown on the button
+
+    Returns:
+        int: Token to embed in the button's callback_data
+    """
+    chat_data = context.chat_data
+    ids = chat_data.setdefault("name_tokens", {})
+    names = chat_data.setdefault("token_names", {})
+
+    token = ids.pop(name, None)
+    if token is None:
+        token = chat_data.get("next_token", 0)
+        chat_data["next_token"] = token + 1
+    else:
+        del names[token]
+    # Re-insert so both dicts stay ordered from least to most recently shown
+    ids[name] = token
+    names[token] = name
+
+    while len(names) > MAX_CALLBACK_TOKENS:
+        del ids[names.pop(next(iter(names)))]
+    return token
+
+def token_name(context: ContextTypes.DEFAULT_TYPE, token: str) -> Optional[str]:
+    """
+    Get the list or item name for a callback token.
+
+    Args:
+        context: The context object
+        token: Token taken from the callback_data
+
+    Returns:
+        Optional[str]: The name, or None if the token is unknown or has expired
+    """
+    return context.chat_data.get("token_names", {}).get(int(token))
+
+# List and item menus show at most MENU_PAGE_SIZE buttons at a time, with
+# Prev/Next buttons to move between pages
+MENU_PAGE_SIZE = 20
+MENU_PAGE_PATTERN = re.compile(r"^\w+_page_\d+$")
+# Paged menus remembered per chat for turn_menu_page; older ones expire
+MAX_STORED_MENUS = 20
+
+def remember_menu(context: ContextTypes.DEFAULT_TYPE, message, user_id: int, prefix: str, names) -> None:
+    """
+    Keep the names of a paged menu for the handler modules' turn_menu_page.
+    Menus are stored per message, so each message keeps paging through its own
+    names whoever opened a menu after it; only the newest MAX_STORED_MENUS
+    are kept, and paging an older one reports the menu as expired.
+
+    Args:
+        context: The context object
+        message: Message the menu was sent in or edited into
+        user_id: Telegram user ID of the user the menu was shown to
+        prefix: Callback data prefix identifying the action
+        names: All names in the menu
+    """
+    if message is None or len(names) <= MENU_PAGE_SIZE:
+        return
+
+    menus = context.chat_data.setdefault("menus", {})
+    key = (message.message_id, prefix)
+    # Re-insert so the dict's order stays oldest first
+    menus.pop(key, None)
+    menus[key] = (user_id, tuple(names))
+    while len(menus) > MAX_STORED_MENUS:
+        del menus[next(iter(menus))]
+
+def stored_menu(context: ContextTypes.DEFAULT_TYPE, message, prefix: str) -> Optional[tuple[int, tuple[str, ...]]]:
+    """
+    Get a paged menu kept by remember_menu.
+
+    Args:
+        context: The context object
+        message: Message the menu is shown in
+        prefix: Callback data prefix identifying the action
+
+    Returns:
+        Optional[tuple[int, tuple[str, ...]]]: The user the menu was shown to and
+        all its names, or None if the menu has expired
+    """
+    if message is None:
+        return None
+    return context.chat_data.get("menus", {}).get((message.message_id, prefix))
+
+# Last text and keyboard the bot put on each (chat_id, message_id)
+_edited_cache = TTLCache(maxsize=10_000, ttl=600.0)
+
+async def edit_message(query, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """
+    Edit the message a callback query came from, unless it already shows this content.
+    Repeated presses of the same button would otherwise cost a Bot API call
+    that Telegram rejects with "message is not modified".
+
+    Args:
+        query: The callback query
+        text: New message text
+        reply_markup: Keyboard to attach to the message, if any
+    """
+    message = query.message
+    if message is None:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+        return
+
+    key = (message.chat_id, message.message_id)
+    content = (text, reply_markup)
+    if _edited_cache.get(key) == content:
+        return
+
+    await query.edit_message_text(text, reply_markup=reply_markup)
+    _edited_cache.set(key, content)
+
+def forget_edit(message) -> None:
+    """
+    Forget what edit_message last put on a message.
+    Call it after changing the message some other way, e.g. with
+    edit_message_reply_markup, so the next edit_message is not skipped.
+
+    Args:
+        message: The message that changed
+    """
+    _edited_cache.pop((message.chat_id, message.message_id))
+
+# Admin status per (chat_id, user_id). Admin rights change
+# rarely, so this saves a getChatMember round-trip on most gated commands;
+# chat member updates drop stale entries early.
+_admin_cache = TTLCache(maxsize=10_000, ttl=300.0)
+
+async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE, admin_ids: Collection[int] = frozenset()) -> bool:
+    """
+    Check if the user is an admin in the chat.
+    In private chats, and for users listed in admin_ids, the user is always
+    considered an admin.
+
+    Args:
+        update: The update object
+        context: The context object
+        admin_ids: Telegram user IDs that are admins in every chat
+
+    Returns:
+        bool: True if the user is an admin, False otherwise
+    """
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id
+
+    # If in a private chat, the user is always considered an admin
+    if update.effective_chat.type == 'private' or user_id in admin_ids:
+        return True
+
+    key = (chat_id, user_id)
+    cached = _admin_cache.get(key)
+    if cached is not None:
+        return cached
+
+    try:
+        # Check if the user is an admin in the chat
+        chat_member = await context.bot.get_chat_member(chat_id, user_id)
+    except Exception as e:
+        logger.error("Error checking admin status: %s", e)
+        return False
+
+    admin = chat_member.status in ['creator', 'administrator']
+    _admin_cache.set(key, admin)
+    return admin
+
+async def chat_member_updated(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Forget the cached admin status of a member whose role changed."""
+    member_update = update.chat_member
+    _admin_cache.pop((member_update.chat.id, member_update.new_chat_member.user.id))
+
+def run_bot(application: Application, close_loop: bool = True) -> None:
+    """
+    Run the bot until it is stopped.
+    With PUBLIC_URL set, Telegram pushes updates to a webhook served on PORT;
+    otherwise the bot falls back to long polling (e.g. for local development).
+
+    Args:
+        application: Application returned by a handler module's setup_bot
+        close_loop: Whether to close the event loop once the bot stops
+    """
+    if PUBLIC_URL:
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path="webhook",
+            webhook_url=PUBLIC_URL.rstrip("/") + "/webhook",
+            secret_token=WEBHOOK_SECRET,
+            max_connections=40,
+            bootstrap_retries=-1,
+            allowed_updates=ALLOWED_UPDATES,
+            close_loop=close_loop,
+        )
+        return
+
+    application.run_polling(
+        timeout=POLL_TIMEOUT,
+        bootstrap_retries=-1,
+        allowed_updates=ALLOWED_UPDATES,
+        close_loop=close_loop,
+    )
@@ -1,51 +1,131 @@
-import os
 import logging
+import re
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.constants import MessageLimit
 from telegram.ext import (
-    Updater, CommandHandler, CallbackQueryHandler, 
-    MessageHandler, Filters, CallbackContext, ConversationHandler
+    ApplicationBuilder, CommandHandler, CallbackQueryHandler,
+    MessageHandler, filters, ContextTypes, ConversationHandler
 )
+
+from cache import TTLCache
+from config import cached_env
 from data_store import DataStore
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG,
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # State definitions for conversation handler
 CREATE_LIST, ADD_ITEM, SELECT_LIST, RATE_ITEM, SELECTING_ITEM_TO_RATE = range(5)
 
-# Initialize the data store
-data_store = DataStore()
+# Long-polling settings: each getUpdates call is held open by Telegram for up to
+# POLL_TIMEOUT seconds and returns as soon as updates arrive (up to 100 per batch),
+# so an idle bot makes one request per POLL_TIMEOUT instead of spinning.
+# POLL_INTERVAL adds an optional pause between requests for very constrained hosts.
+POLL_TIMEOUT = 30
+POLL_INTERVAL = float(cached_env("POLL_INTERVAL", "0"))
+
+# Only ask Telegram for the update types the handlers below consume
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Maximum number of updates processed concurrently. DataStore methods are
+# synchronous, so they run atomically on the event loop without extra locking.
+CONCURRENT_UPDATES = 64
+
+# Callback data patterns, compiled once and shared by the handlers below
+_ADD_TO_PATTERN = re.compile(r"^add_to_")
+_VIEW_PATTERN = re.compile(r"^view_")
+_RATE_LIST_PATTERN = re.compile(r"^rate_list_")
+_RATE_ITEM_PATTERN = re.compile(r"^rate_item_")
+_GIVE_RATING_PATTERN = re.compile(r"^give_rating_")
+_RATINGS_PATTERN = re.compile(r"^ratings_")
+
+# Rating picker for 0-10, four buttons per row; the same for every item
+_RATING_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton(str(i), callback_data=f"give_rating_{i}") for i in range(j, min(j + 4, 11))]
+    for j in range(0, 11, 4)
+])
+
+@lru_cache(maxsize=1024)
+def _choice_keyboard(prefix, names):
+    """Build a one-button-per-row keyboard for a tuple of list or item names."""
+    button = InlineKeyboardButton
+    return InlineKeyboardMarkup([[button(name, callback_data=prefix + name)] for name in names])
+
+# Command list shared by the /start and /help messages
+_COMMANDS_TEXT = (
+    "/newlist - Create a new list\n"
+    "/additem - Add an item to a list\n"
+    "/lists - View all available lists\n"
+    "/viewlist - View items in a specific list\n"
+    "/rate - Rate an item in a list\n"
+    "/ratings - View ratings for items in a list\n"
+    "/help - Show this help message"
+)
+_WELCOME_MSG = (
+    "Welcome to List Rater Bot!\n\n"
+    "You can use this bot to create lists and rate items from 0 to 10.\n\n"
+    "Commands:\n" + _COMMANDS_TEXT
+)
+_HELP_MSG = "List Rater Bot Commands:\n\n" + _COMMANDS_TEXT
+
+# Bot token, read once at import time and checked in setup_bot
+TELEGRAM_TOKEN = cached_env("TELEGRAM_TOKEN")
+
+# Initialize the data store; set DATA_STORE_PATH to persist it to SQLite
+data_store = DataStore(cached_env("DATA_STORE_PATH"))
+
+# Per-user cache of list names; the list menus are usually opened one after
+# another, so this saves repeated DataStore reads. Only creating a list changes
+# the names, and create_list drops the entry, so the TTL only bounds how long
+# idle entries live.
+_lists_cache = TTLCache(maxsize=10_000, ttl=60.0)
+
+def _cached_lists(user_id):
+    """Return the user's list names, reusing a recent lookup if there is one."""
+    lists = _lists_cache.get(user_id)
+    if lists is None:
+        lists = tuple(data_store.get_all_lists(user_id))
+        _lists_cache.set(user_id, lists)
+    return lists
 
 # Command handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a welcome message when the command /start is issued."""
-    await update.message.reply_text(
-        "Welcome to List Rater Bot!\n\n"
-        "You can use this bot to create lists and rate items from 0 to 10.\n\n"
-        "Commands:\n"
-        "/newlist - Create a new list\n"
-        "/additem - Add an item to a list\n"
-        "/lists - View all available lists\n"
-        "/viewlist - View items in a specific list\n"
-        "/rate - Rate an item in a list\n"
-        "/ratings - View ratings for items in a list\n"
-        "/help - Show this help message"
-    )
+    await update.message.reply_text(_WELCOME_MSG)
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a help message when the command /help is issued."""
-    await update.message.reply_text(
-        "List Rater Bot Commands:\n\n"
-        "/newlist - Create a new list\n"
-        "/additem - Add an item to a list\n"
-        "/lists - View all available lists\n"
-        "/viewlist - View items in a specific list\n"
-        "/rate - Rate an item in a list\n"
-        "/ratings - View ratings for items in a list\n"
-        "/help - Show this help message"
-    )
+    await update.message.reply_text(_HELP_MSG)
+
+# Message helpers
+def _split_message(parts, limit=MessageLimit.MAX_TEXT_LENGTH):
+    """Join message parts into chunks that fit in one Telegram message each."""
+    chunks = []
+    current = []
+    size = 0
+    for part in parts:
+        # Each part after the first in a chunk costs one extra newline
+        if current and size + 1 + len(part) > limit:
+            chunks.append("\n".join(current))
+            current = []
+            size = 0
+        while len(part) > limit:
+            chunks.append(part[:limit])
+            part = part[limit:]
+        size += len(part) + (1 if current else 0)
+        current.append(part)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+async def _send_many(bot, chat_id, texts):
+    """
+    Send several messages to a chat in order.
+    Telegram does not guarantee delivery order for concurrent requests, so
+    the sends are awaited one after another.
+    """
+    for text in texts:
+        await bot.send_message(chat_id, text)
 
 # List creation handlers
 async def new_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -58,7 +138,7 @@ async def new_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def create_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Create a new list with the provided name."""
     list_name = update.message.text
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
     
     # Check if list name already exists for this user
     if data_store.list_exists(user_id, list_name):
@@ -69,6 +149,7 @@ async def create_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     
     # Create the new list
     data_store.create_list(user_id, list_name)
+    _lists_cache.pop(user_id)
     
     await update.message.reply_text(
         f"Great! I've created a new list called '{list_name}'.\n"
@@ -79,8 +160,8 @@ async def create_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 # List viewing handlers
 async def show_lists(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show all lists created by the user."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
+    user_id = update.effective_user.id
+    lists = _cached_lists(user_id)
     
     if not lists:
         await update.message.reply_text(
@@ -88,17 +169,16 @@ async def show_lists(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         )
         return
     
-    message = "Your lists:\n\n"
-    for i, list_name in enumerate(lists, 1):
-        message += f"{i}. {list_name}\n"
+    parts = ["Your lists:\n\n"]
+    parts.extend(f"{i}. {list_name}\n" for i, list_name in enumerate(lists, 1))
     
-    await update.message.reply_text(message)
+    await update.message.reply_text("".join(parts))
 
 # Item addition handlers
 async def add_item_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of adding an item to a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
+    user_id = update.effective_user.id
+    lists = _cached_lists(user_id)
     
     if not lists:
         await update.message.reply_text(
@@ -106,11 +186,7 @@ async def add_item_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"add_to_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _choice_keyboard("add_to_", tuple(lists))
     await update.message.reply_text("Choose a list to add an item to:", reply_markup=reply_markup)
     
     return SELECT_LIST
@@ -120,7 +196,7 @@ async def select_list_for_item(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
     
-    list_name = query.data.replace("add_to_", "")
+    list_name = query.data.removeprefix("add_to_")
     context.user_data["selected_list"] = list_name
     
     await query.edit_message_text(f"What item would you like to add to '{list_name}'?")
@@ -129,7 +205,7 @@ async def select_list_for_item(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def add_item_to_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Add an item to the selected list."""
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
     list_name = context.user_data.get("selected_list")
     item_name = update.message.text
     
@@ -157,8 +233,8 @@ async def add_item_to_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 # View list items handlers
 async def view_list_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of viewing items in a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
+    user_id = update.effective_user.id
+    lists = _cached_lists(user_id)
     
     if not lists:
         await update.message.reply_text(
@@ -166,11 +242,7 @@ async def view_list_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"view_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _choice_keyboard("view_", tuple(lists))
     await update.message.reply_text("Choose a list to view:", reply_markup=reply_markup)
     
     return SELECT_LIST
@@ -180,8 +252,8 @@ async def view_list_items(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     query = update.callback_query
     await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("view_", "")
+    user_id = query.from_user.id
+    list_name = query.data.removeprefix("view_")
     
     items = data_store.get_list_items(user_id, list_name)
     
@@ -190,21 +262,24 @@ async def view_list_items(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             f"The list '{list_name}' is empty. Add items with /additem"
         )
     else:
-        message = f"Items in '{list_name}':\n\n"
-        for i, item_data in enumerate(items.items(), 1):
-            item_name, ratings = item_data
-            avg_rating = sum(ratings) / len(ratings) if ratings else "Not yet rated"
-            message += f"{i}. {item_name} - Average rating: {avg_rating}\n"
+        parts = [f"Items in '{list_name}':\n"]
+        append = parts.append
+        for i, (item_name, ratings) in enumerate(items.items(), 1):
+            if ratings:
+                avg_rating = ratings.mean()
+                append(f"{i}. {item_name} - Average rating: {avg_rating:.1f}/10")
+            else:
+                append(f"{i}. {item_name} - Not yet rated")
         
-        await query.edit_message_text(message)
+        await query.edit_message_text("\n".join(parts))
     
     return ConversationHandler.END
 
 # Rating handlers
 async def rate_item_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of rating an item."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
+    user_id = update.effective_user.id
+    lists = _cached_lists(user_id)
     
     if not lists:
         await update.message.reply_text(
@@ -212,11 +287,7 @@ async def rate_item_start(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"rate_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _choice_keyboard("rate_list_", tuple(lists))
     await update.message.reply_text("Choose a list that contains the item you want to rate:", reply_markup=reply_markup)
     
     return SELECT_LIST
@@ -226,8 +297,8 @@ async def select_list_for_rating(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("rate_list_", "")
+    user_id = query.from_user.id
+    list_name = query.data.removeprefix("rate_list_")
     context.user_data["rating_list"] = list_name
     
     items = data_store.get_list_items(user_id, list_name)
@@ -238,11 +309,7 @@ async def select_list_for_rating(update: Update, context: ContextTypes.DEFAULT_T
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"rate_item_{item_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _choice_keyboard("rate_item_", tuple(items))
     await query.edit_message_text(f"Choose an item from '{list_name}' to rate:", reply_markup=reply_markup)
     
     return SELECTING_ITEM_TO_RATE
@@ -252,19 +319,10 @@ async def select_item_for_rating(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
     
-    item_name = query.data.replace("rate_item_", "")
+    item_name = query.data.removeprefix("rate_item_")
     context.user_data["rating_item"] = item_name
     
-    # Create rating keyboard with buttons 0-10
-    keyboard = []
-    row = []
-    for i in range(11):  # 0 to 10
-        row.append(InlineKeyboardButton(str(i), callback_data=f"give_rating_{i}"))
-        if len(row) == 4 or i == 10:  # 4 buttons per row, or last button
-            keyboard.append(row.copy())
-            row = []
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _RATING_KEYBOARD
     await query.edit_message_text(
         f"Rate '{item_name}' on a scale from 0 to 10:",
         reply_markup=reply_markup
@@ -277,10 +335,10 @@ async def apply_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     query = update.callback_query
     await query.answer()
     
-    user_id = str(query.from_user.id)
+    user_id = query.from_user.id
     list_name = context.user_data.get("rating_list")
     item_name = context.user_data.get("rating_item")
-    rating = int(query.data.replace("give_rating_", ""))
+    rating = int(query.data.removeprefix("give_rating_"))
     
     if not all([list_name, item_name]):
         await query.edit_message_text("Something went wrong. Please try again with /rate")
@@ -298,8 +356,8 @@ async def apply_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 # View ratings handlers
 async def view_ratings_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of viewing ratings for items in a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
+    user_id = update.effective_user.id
+    lists = _cached_lists(user_id)
     
     if not lists:
         await update.message.reply_text(
@@ -307,11 +365,7 @@ async def view_ratings_start(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"ratings_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = _choice_keyboard("ratings_", tuple(lists))
     await update.message.reply_text("Choose a list to view ratings:", reply_markup=reply_markup)
     
     return SELECT_LIST
@@ -321,8 +375,8 @@ async def view_list_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("ratings_", "")
+    user_id = query.from_user.id
+    list_name = query.data.removeprefix("ratings_")
     
     items = data_store.get_list_items(user_id, list_name)
     
@@ -331,18 +385,24 @@ async def view_list_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"The list '{list_name}' is empty. Add items with /additem"
         )
     else:
-        message = f"Ratings for items in '{list_name}':\n\n"
+        parts = [f"Ratings for items in '{list_name}':\n"]
+        append = parts.append
         for item_name, ratings in items.items():
             if ratings:
-                avg_rating = sum(ratings) / len(ratings)
-                all_ratings = ", ".join(str(r) for r in ratings)
-                message += f"• {item_name}\n"
-                message += f"  Average: {avg_rating:.1f}/10\n"
-                message += f"  All ratings: {all_ratings}\n\n"
+                append(
+                    f"• {item_name}\n"
+                    f"  Average: {ratings.mean():.1f}/10\n"
+                    f"  All ratings: {', '.join(map(str, ratings.values))}\n"
+                )
             else:
-                message += f"• {item_name}: Not yet rated\n\n"
+                append(f"• {item_name}: Not yet rated\n")
         
-        await query.edit_message_text(message)
+        # Long lists can exceed Telegram's message limit; the first chunk
+        # replaces the menu and the rest follow as new messages
+        first, *rest = _split_message(parts)
+        await query.edit_message_text(first)
+        if rest:
+            await _send_many(context.bot, query.message.chat_id, rest)
     
     return ConversationHandler.END
 
@@ -354,14 +414,12 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 def setup_bot():
     """Set up the Telegram bot with all handlers."""
-    # Get telegram token from environment
-    telegram_token = os.environ.get("TELEGRAM_TOKEN")
-    if not telegram_token:
+    if not TELEGRAM_TOKEN:
         logger.error("TELEGRAM_TOKEN environment variable is not set")
         raise ValueError("TELEGRAM_TOKEN environment variable is required")
     
-    # Create the application
-    application = ApplicationBuilder().token(telegram_token).build()
+    # Handle up to CONCURRENT_UPDATES updates at once so users don't wait on each other
+    application = ApplicationBuilder().token(TELEGRAM_TOKEN).concurrent_updates(CONCURRENT_UPDATES).build()
     
     # Add handlers
     # Create list conversation
@@ -377,7 +435,7 @@ def setup_bot():
     add_item_handler = ConversationHandler(
         entry_points=[CommandHandler("additem", add_item_start)],
         states={
-            SELECT_LIST: [CallbackQueryHandler(select_list_for_item, pattern="^add_to_")],
+            SELECT_LIST: [CallbackQueryHandler(select_list_for_item, pattern=_ADD_TO_PATTERN)],
             ADD_ITEM: [MessageHandler(filters.TEXT & ~filters.COMMAND, add_item_to_list)]
         },
         fallbacks=[CommandHandler("cancel", cancel)]
@@ -387,7 +445,7 @@ def setup_bot():
     view_list_handler = ConversationHandler(
         entry_points=[CommandHandler("viewlist", view_list_start)],
         states={
-            SELECT_LIST: [CallbackQueryHandler(view_list_items, pattern="^view_")]
+            SELECT_LIST: [CallbackQueryHandler(view_list_items, pattern=_VIEW_PATTERN)]
         },
         fallbacks=[CommandHandler("cancel", cancel)]
     )
@@ -396,9 +454,9 @@ def setup_bot():
     rate_item_handler = ConversationHandler(
         entry_points=[CommandHandler("rate", rate_item_start)],
         states={
-            SELECT_LIST: [CallbackQueryHandler(select_list_for_rating, pattern="^rate_list_")],
-            SELECTING_ITEM_TO_RATE: [CallbackQueryHandler(select_item_for_rating, pattern="^rate_item_")],
-            RATE_ITEM: [CallbackQueryHandler(apply_rating, pattern="^give_rating_")]
+            SELECT_LIST: [CallbackQueryHandler(select_list_for_rating, pattern=_RATE_LIST_PATTERN)],
+            SELECTING_ITEM_TO_RATE: [CallbackQueryHandler(select_item_for_rating, pattern=_RATE_ITEM_PATTERN)],
+            RATE_ITEM: [CallbackQueryHandler(apply_rating, pattern=_GIVE_RATING_PATTERN)]
         },
         fallbacks=[CommandHandler("cancel", cancel)]
     )
@@ -407,7 +465,7 @@ def setup_bot():
     view_ratings_handler = ConversationHandler(
         entry_points=[CommandHandler("ratings", view_ratings_start)],
         states={
-            SELECT_LIST: [CallbackQueryHandler(view_list_ratings, pattern="^ratings_")]
+            SELECT_LIST: [CallbackQueryHandler(view_list_ratings, pattern=_RATINGS_PATTERN)]
         },
         fallbacks=[CommandHandler("cancel", cancel)]
     )
@@ -422,7 +480,20 @@ def setup_bot():
     application.add_handler(rate_item_handler)
     application.add_handler(view_ratings_handler)
     
-    # Start the bot (polling mode)
-    application.run_polling()
-    
     return application
+
+def run_bot(application, close_loop=True):
+    """
+    Run the bot in long polling mode until it is stopped.
+    
+    Args:
+        application: Application returned by setup_bot
+        close_loop: Whether to close the event loop once the bot stops
+    """
+    application.run_polling(
+        poll_interval=POLL_INTERVAL,
+        timeout=POLL_TIMEOUT,
+        bootstrap_retries=-1,
+        allowed_updates=ALLOWED_UPDATES,
+        close_loop=close_loop,
+    )
@@ -1,237 +1,539 @@
+import asyncio
 import os
 import logging
+import re
+from enum import IntEnum
+from functools import lru_cache
+from typing import Optional
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
-    Updater, CommandHandler, CallbackQueryHandler, 
-    MessageHandler, Filters, CallbackContext, ConversationHandler
+    Application, ApplicationBuilder, ChatMemberHandler, CommandHandler, CallbackQueryHandler,
+    MessageHandler, filters, ContextTypes, ConversationHandler, PersistenceInput, PicklePersistence
 )
+from bot_common import (
+    MENU_PAGE_PATTERN, MENU_PAGE_SIZE, RatingTexts, chat_member_updated, edit_message, forget_edit,
+    is_admin, name_token, paginate, rating_lines, remember_menu, run_bot, stored_menu, token_name
+)
+from cache import TTLCache
+from config import cached_env
 from data_store import DataStore
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG,
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# State definitions for conversation handler
-CREATE_LIST, ADD_ITEM, SELECT_LIST, RATE_ITEM, SELECTING_ITEM_TO_RATE, ADD_COMMENT = range(6)
-DELETE_LIST, DELETE_ITEM, DELETE_RATING, CONFIRM_DELETE = range(6, 10)
+class State(IntEnum):
+    """Conversation states, numbered densely from 0."""
+    CREATE_LIST = 0
+    ADD_ITEM = 1
+    SELECT_LIST = 2
+    RATE_ITEM = 3
+    SELECTING_ITEM_TO_RATE = 4
+    ADD_COMMENT = 5
+    DELETE_LIST = 6
+    DELETE_ITEM = 7
+    DELETE_RATING = 8
+    CONFIRM_DELETE = 9
+
+# Maximum number of updates processed concurrently. DataStore methods are
+# synchronous, so they run atomically on the event loop without extra locking.
+CONCURRENT_UPDATES = 256
 
-# Initialize the data store
-data_store = DataStore()
+# HTTP connection pool used for Bot API requests. getUpdates has its own
+# small pool since only one long-poll request is in flight at a time.
+# Bot API calls use HTTP/2, so concurrent requests share a few TLS
+# connections instead of each opening its own.
+HTTP_VERSION = "2"
+CONNECT_TIMEOUT = 5.0
+CONNECTION_POOL_SIZE = 512
+GET_UPDATES_POOL_SIZE = 2
+POOL_TIMEOUT = 30.0
+READ_TIMEOUT = 20.0
+WRITE_TIMEOUT = 20.0
 
-# Commands that are restricted to admins only
-ADMIN_COMMANDS = ['/newlist', '/deletelist', '/deleteitem', '/deleterating', '/clearratings']
+# Set BOT_STATE_PATH to keep user_data and conversation states in a pickle file
+# across restarts; changes are flushed every PERSISTENCE_INTERVAL seconds.
+# chat_data only holds callback tokens and paged menus, which are rebuilt as
+# menus are shown, so it is not persisted: menus sent before a restart report
+# themselves as expired, while text prompts and Yes/No confirmations resume.
+BOT_STATE_PATH = cached_env("BOT_STATE_PATH")
+PERSISTENCE_INTERVAL = 5.0
+PERSISTED_DATA = PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False)
 
-def is_admin(update: Update, context: CallbackContext) -> bool:
+def _parse_admin_ids(value: Optional[str]) -> frozenset[int]:
     """
-    Check if the user is an admin in the chat.
-    In private chats, the user is always considered an admin.
+    Parse a comma-separated list of Telegram user IDs.
+    Entries that are not numeric IDs (e.g. "@bob") are logged and skipped, so
+    a typo in the setting cannot keep the bot from starting.
     
     Args:
-        update: The update object
-        context: The context object
+        value: The setting, or None if it is not set
         
     Returns:
-        bool: True if the user is an admin, False otherwise
+        frozenset[int]: The valid user IDs
     """
-    chat_id = update.effective_chat.id
-    user_id = update.effective_user.id
+    user_ids = set()
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if entry.isdigit():
+            user_ids.add(int(entry))
+        else:
+            logger.warning("Ignoring invalid ADMIN_IDS entry %r: expected a numeric Telegram user ID", entry)
+    return frozenset(user_ids)
+
+# Comma-separated Telegram user IDs in ADMIN_IDS are admins in every chat,
+# without asking Telegram for their chat member status
+ADMIN_IDS = _parse_admin_ids(cached_env("ADMIN_IDS"))
+
+# Long replies are split into pages below Telegram's 4096-character limit and
+# cut off after MAX_MESSAGE_PAGES messages
+MESSAGE_PAGE_SIZE = 4000
+MAX_MESSAGE_PAGES = 3
+TRUNCATED_NOTE = "\n\n... (message truncated due to length)"
+
+# Texts of the /ratings overview, laid out by rating_lines
+_RATING_TEXTS = RatingTexts(
+    header="Ratings for items in '{list_name}':\n\n",
+    rated="• {item_name}\n  Average: {mean:.1f}/10\n  All ratings:\n",
+    unrated="• {item_name}: Not yet rated\n\n",
+)
+
+# Plain text replies inside a conversation, built once and shared
+TEXT_MESSAGE = filters.TEXT & ~filters.COMMAND
+
+# Callback data patterns, compiled once and shared by the handlers below
+_ADD_TO_PATTERN = re.compile(r"^add_to_\d+$")
+_VIEW_PATTERN = re.compile(r"^view_\d+$")
+_RATE_LIST_PATTERN = re.compile(r"^rate_list_\d+$")
+_RATE_ITEM_PATTERN = re.compile(r"^rate_item_\d+$")
+_GIVE_RATING_PATTERN = re.compile(r"^give_rating_\d+$")
+_RATINGS_PATTERN = re.compile(r"^ratings_\d+$")
+_DELETE_LIST_PATTERN = re.compile(r"^delete_list_\d+$")
+_DELETE_ITEM_LIST_PATTERN = re.compile(r"^delete_item_list_\d+$")
+_DELETE_ITEM_PATTERN = re.compile(r"^delete_item_\d+$")
+_DELETE_RATING_LIST_PATTERN = re.compile(r"^delete_rating_list_\d+$")
+_DELETE_RATING_ITEM_PATTERN = re.compile(r"^delete_rating_item_\d+$")
+_DELETE_RATING_PATTERN = re.compile(r"^(delete_rating_\d+|delete_all_ratings)$")
+_CLEAR_RATINGS_LIST_PATTERN = re.compile(r"^clear_ratings_list_\d+$")
+_CLEAR_RATINGS_ITEM_PATTERN = re.compile(r"^(clear_ratings_item_\d+|clear_ratings_all)$")
+_CONFIRMATION_PATTERN = re.compile(r"^(confirm|cancel)_\w+$")
+
+@lru_cache(maxsize=None)
+def get_data_store() -> DataStore:
+    """
+    Get the shared data store, creating it on first use.
+    Set DATA_STORE_PATH to persist it to SQLite; the database is only opened
+    and loaded once the first update needs it, not when this module is imported.
     
-    # If in a private chat, the user is always considered an admin
-    if update.effective_chat.type == 'private':
-        return True
+    Returns:
+        DataStore: The data store
+    """
+    return DataStore(cached_env("DATA_STORE_PATH"))
+
+# Per-user cache of list names and per-list cache of items. A conversation
+# reads the same lists and items at several steps; every write below drops
+# the affected entries, so the TTL only bounds how long idle entries live.
+_lists_cache = TTLCache(maxsize=10_000, ttl=60.0)
+_items_cache = TTLCache(maxsize=10_000, ttl=60.0)
+
+def get_all_lists_cached(user_id: int) -> tuple[str, ...]:
+    """
+    Get the user's list names, reusing a lookup from the last few seconds.
+    
+    Args:
+        user_id: Telegram user ID
+        
+    Returns:
+        tuple[str, ...]: Names of the user's lists
+    """
+    lists = _lists_cache.get(user_id)
+    if lists is None:
+        lists = tuple(get_data_store().get_all_lists(user_id))
+        _lists_cache.set(user_id, lists)
+    return lists
+
+def get_list_items_cached(user_id: int, list_name: str) -> dict:
+    """
+    Get the items of one of the user's lists, reusing a recent lookup.
+    
+    Args:
+        user_id: Telegram user ID
+        list_name: Name of the list
         
-    try:
-        # Check if the user is an admin in the chat
-        chat_member = context.bot.get_chat_member(chat_id, user_id)
-        return chat_member.status in ['creator', 'administrator']
-    except Exception as e:
-        logger.error(f"Error checking admin status: {e}")
-        return False
+    Returns:
+        dict: Item names mapped to their ratings
+    """
+    key = (user_id, list_name)
+    items = _items_cache.get(key)
+    if items is None:
+        items = get_data_store().get_list_items(user_id, list_name)
+        _items_cache.set(key, items)
+    return items
+
+def invalidate_cached_list(user_id: int, list_name: str, lists_changed: bool = False) -> None:
+    """
+    Drop cached data made stale by a write to a list.
+    
+    Args:
+        user_id: Telegram user ID
+        list_name: Name of the list that changed
+        lists_changed: Whether the list itself was created or deleted
+    """
+    _items_cache.pop((user_id, list_name))
+    if lists_changed:
+        _lists_cache.pop(user_id)
+
+# Static /start and /help texts; the admin variants add the admin command list
+_START_MSG = (
+    "¡Bienvenido al Bot de Listas y Valoraciones!\n\n"
+    "Puedes usar este bot para crear listas y valorar elementos del 0 al 10, con la opción de añadir comentarios a tus valoraciones.\n\n"
+    "Comandos:\n"
+    "/additem - Añadir un elemento a una lista\n"
+    "/lists - Ver todas las listas disponibles\n"
+    "/viewlist - Ver elementos de una lista específica\n"
+    "/rate - Valorar un elemento de una lista y añadir comentarios\n"
+    "/ratings - Ver valoraciones y comentarios de elementos en una lista\n"
+    "/help - Mostrar este mensaje de ayuda\n"
+    "/cancel - Cancelar la operación actual"
+)
+_HELP_MSG = (
+    "Comandos del Bot de Listas y Valoraciones:\n\n"
+    "/additem - Añadir un elemento a una lista\n"
+    "/lists - Ver todas las listas disponibles\n"
+    "/viewlist - Ver elementos de una lista específica\n"
+    "/rate - Valorar un elemento (0-10) y añadir comentarios\n"
+    "/ratings - Ver valoraciones y comentarios de elementos\n"
+    "/help - Mostrar este mensaje de ayuda\n"
+    "/cancel - Cancelar la operación actual\n\n"
+    "Consejos para valoraciones:\n"
+    "- Al valorar elementos, puedes añadir un comentario explicando tu valoración\n"
+    "- Usa /skip para omitir añadir un comentario si no quieres explicar tu valoración"
+)
+_ADMIN_COMMANDS_MSG = (
+    "\n\nAdmin Commands (only available to chat administrators):\n"
+    "/newlist - Create a new list\n"
+    "/deletelist - Delete a list and all its items\n"
+    "/deleteitem - Delete an item from a list\n"
+    "/deleterating - Delete a specific rating\n"
+    "/clearratings - Clear all ratings for an item"
+)
+_START_ADMIN_MSG = _START_MSG + _ADMIN_COMMANDS_MSG
+_HELP_ADMIN_MSG = _HELP_MSG + _ADMIN_COMMANDS_MSG
+
+# Rating keyboard with buttons 0-10, four per row; the same for every item
+_RATING_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton(str(i), callback_data=f"give_rating_{i}") for i in range(row, min(row + 4, 11))]
+    for row in (0, 4, 8)
+])
+
+# Yes/No keyboards for the confirmation dialogs; they never change
+_CONFIRM_DELETE_LIST_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Yes, delete this list", callback_data="confirm_delete_list")],
+    [InlineKeyboardButton("No, keep this list", callback_data="cancel_delete")]
+])
+_CONFIRM_DELETE_ITEM_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Yes, delete this item", callback_data="confirm_delete_item")],
+    [InlineKeyboardButton("No, keep this item", callback_data="cancel_delete")]
+])
+_CONFIRM_DELETE_ALL_RATINGS_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Yes, delete ALL ratings", callback_data="confirm_delete_rating")],
+    [InlineKeyboardButton("No, keep the ratings", callback_data="cancel_delete")]
+])
+_CONFIRM_DELETE_RATING_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Yes, delete this rating", callback_data="confirm_delete_rating")],
+    [InlineKeyboardButton("No, keep this rating", callback_data="cancel_delete")]
+])
+_CONFIRM_CLEAR_RATINGS_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Yes, clear ALL ratings", callback_data="confirm_clear_ratings")],
+    [InlineKeyboardButton("No, keep the ratings", callback_data="cancel_clear")]
+])
+
+# Deletions that go through a Yes/No confirmation. The confirm step stores
+# (action, args) in user_data["pending_action"]; execute_confirmed_action then
+# calls operation(get_data_store(), user_id, *args) and formats the reply with args.
+# Each entry: (operation, lists_changed, done, failed, cancelled)
+_CONFIRMED_ACTIONS = {
+    "delete_list": (
+        DataStore.delete_list, True,
+        "The list '{0}' has been deleted.",
+        "Failed to delete the list '{0}'. Please try again later.",
+        "Deletion cancelled. Your list is safe."
+    ),
+    "delete_item": (
+        DataStore.delete_item, False,
+        "The item '{1}' has been deleted from the list '{0}'.",
+        "Failed to delete the item '{1}'. Please try again later.",
+        "Deletion cancelled. Your item is safe."
+    ),
+    "delete_rating": (
+        DataStore.delete_rating, False,
+        "The selected rating for the item '{1}' has been deleted.",
+        "Failed to delete the rating. Please try again later.",
+        "Deletion cancelled. The rating is safe."
+    ),
+    "delete_all_ratings": (
+        DataStore.clear_ratings, False,
+        "All ratings for the item '{1}' have been deleted.",
+        "Failed to delete the rating. Please try again later.",
+        "Deletion cancelled. The rating is safe."
+    ),
+    "clear_ratings": (
+        DataStore.clear_ratings, False,
+        "All ratings for the item '{1}' have been cleared.",
+        "Failed to clear ratings for the item '{1}'. Please try again later.",
+        "Operation cancelled. Your ratings are safe."
+    ),
+    "clear_all_ratings": (
+        DataStore.clear_ratings_bulk, False,
+        "Cleared the ratings of {result} items in the list '{0}'.",
+        "No items in the list '{0}' had ratings to clear.",
+        "Operation cancelled. Your ratings are safe."
+    ),
+}
+
+# Extra row in the clear ratings item menu to clear every rated item at once
+_CLEAR_ALL_ITEMS_ROW = (InlineKeyboardButton("Clear ALL rated items", callback_data="clear_ratings_all"),)
+
+# Button rows shown below the names on every page of a menu, by callback prefix
+_MENU_EXTRA_ROWS = {"clear_ratings_item_": (_CLEAR_ALL_ITEMS_ROW,)}
+
+def _name_keyboard(context: ContextTypes.DEFAULT_TYPE, prefix: str, names, page: int = 0) -> InlineKeyboardMarkup:
+    """
+    Build a one-button-per-row keyboard for one page of list or item names.
+    Menus with more than one page must be passed to remember_menu once sent,
+    so turn_menu_page can show the other pages.
+    
+    Args:
+        context: The context object
+        prefix: Callback data prefix identifying the action
+        names: Names to show, one per button
+        page: Zero-based page to show
         
+    Returns:
+        InlineKeyboardMarkup: The keyboard
+    """
+    button = InlineKeyboardButton
+    start = page * MENU_PAGE_SIZE
+    keyboard = [
+        [button(name, callback_data=f"{prefix}{name_token(context, name)}")]
+        for name in names[start:start + MENU_PAGE_SIZE]
+    ]
+    
+    nav = []
+    if page > 0:
+        nav.append(button("« Prev", callback_data=f"{prefix}page_{page - 1}"))
+    if start + MENU_PAGE_SIZE < len(names):
+        nav.append(button("Next »", callback_data=f"{prefix}page_{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    if names:
+        keyboard.extend(_MENU_EXTRA_ROWS.get(prefix, ()))
+    
+    return InlineKeyboardMarkup(keyboard)
+
+async def turn_menu_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+    """Show another page of a list or item menu, staying in the same conversation state."""
+    query = update.callback_query
+    
+    prefix, _, page = query.data.rpartition("page_")
+    message = query.message
+    menu = stored_menu(context, message, prefix)
+    if menu is None:
+        return await _menu_expired(query, answer=True)
+    
+    user_id, names = menu
+    if user_id != query.from_user.id:
+        # Someone else's menu in a group; leave it as it is
+        await query.answer("This menu belongs to another user.")
+        return None
+    
+    await asyncio.gather(
+        query.answer(),
+        query.edit_message_reply_markup(reply_markup=_name_keyboard(context, prefix, names, int(page)))
+    )
+    # The keyboard changed behind edit_message's back
+    forget_edit(message)
+    return None
+
+def _rating_label(rating: int, comment: str) -> str:
+    """Format a rating for a button, shortening long comments to 20 characters."""
+    if not comment:
+        return f"{rating}/10"
+    if len(comment) > 20:
+        comment = comment[:19] + "…"
+    return f"{rating}/10 - \"{comment}\""
+
+async def _menu_expired(query, answer: bool = False) -> int:
+    """Tell the user a menu button is no longer valid and end the conversation."""
+    if answer:
+        await _answer_and_edit(query, "This menu has expired. Please start again.")
+    else:
+        await edit_message(query, "This menu has expired. Please start again.")
+    return ConversationHandler.END
+
+async def _answer_and_edit(query, text: str, reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """
+    Answer a callback query and edit its message at the same time.
+    The two Bot API requests are independent, so neither waits on the other.
+    
+    Args:
+        query: The callback query
+        text: New message text
+        reply_markup: Keyboard to attach to the message, if any
+    """
+    await asyncio.gather(query.answer(), edit_message(query, text, reply_markup))
+
 def admin_required(func):
     """
     Decorator to restrict handler access to admins only.
+    Only apply it to command entry points: the CommandHandler has already
+    matched the command, so there is nothing left to parse here.
     """
-    def wrapped(update, context, *args, **kwargs):
+    async def wrapped(update, context, *args, **kwargs):
         # Check if user is admin
-        if not is_admin(update, context):
-            command = update.message.text.split()[0] if update.message and update.message.text else ""
-            if command in ADMIN_COMMANDS:
-                update.message.reply_text("This command is only available to chat administrators.")
-                return ConversationHandler.END
+        if not await is_admin(update, context, ADMIN_IDS):
+            await update.message.reply_text("This command is only available to chat administrators.")
+            return ConversationHandler.END
         
         # Call the original handler
-        return func(update, context, *args, **kwargs)
+        return await func(update, context, *args, **kwargs)
     return wrapped
 
-# Command handlers
-def start(update: Update, context: CallbackContext) -> None:
-    """Send a welcome message when the command /start is issued."""
-    is_user_admin = is_admin(update, context)
-    
-    base_message = (
-        "¡Bienvenido al Bot de Listas y Valoraciones!\n\n"
-        "Puedes usar este bot para crear listas y valorar elementos del 0 al 10, con la opción de añadir comentarios a tus valoraciones.\n\n"
-        "Comandos:\n"
-        "/additem - Añadir un elemento a una lista\n"
-        "/lists - Ver todas las listas disponibles\n"
-        "/viewlist - Ver elementos de una lista específica\n"
-        "/rate - Valorar un elemento de una lista y añadir comentarios\n"
-        "/ratings - Ver valoraciones y comentarios de elementos en una lista\n"
-        "/help - Mostrar este mensaje de ayuda\n"
-        "/cancel - Cancelar la operación actual"
-    )
+def make_list_picker(prefix: str, prompt: str, next_state: int, doc: str):
+    """
+    Create a conversation entry point that asks the user to pick one of their lists.
     
-    admin_commands = (
-        "\n\nAdmin Commands (only available to chat administrators):\n"
-        "/newlist - Create a new list\n"
-        "/deletelist - Delete a list and all its items\n"
-        "/deleteitem - Delete an item from a list\n"
-        "/deleterating - Delete a specific rating\n"
-        "/clearratings - Clear all ratings for an item"
-    )
+    Args:
+        prefix: Callback data prefix for the list buttons
+        prompt: Message shown above the list buttons
+        next_state: Conversation state to move to once the menu is shown
+        doc: Docstring for the generated handler
+        
+    Returns:
+        The async handler function
+    """
+    async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user_id = update.effective_user.id
+        lists = get_all_lists_cached(user_id)
+        
+        if not lists:
+            await update.message.reply_text(
+                "You don't have any lists yet. Create one first with /newlist"
+            )
+            return ConversationHandler.END
+        
+        reply_markup = _name_keyboard(context, prefix, lists)
+        message = await update.message.reply_text(prompt, reply_markup=reply_markup)
+        remember_menu(context, message, user_id, prefix, lists)
+        
+        return next_state
     
+    handler.__doc__ = doc
+    return handler
+
+# Command handlers
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send a welcome message when the command /start is issued."""
     # Show admin commands only if the user is an admin
-    if is_user_admin:
-        update.message.reply_text(base_message + admin_commands)
+    if await is_admin(update, context, ADMIN_IDS):
+        await update.message.reply_text(_START_ADMIN_MSG)
     else:
-        update.message.reply_text(base_message)
+        await update.message.reply_text(_START_MSG)
 
-def help_command(update: Update, context: CallbackContext) -> None:
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a help message when the command /help is issued."""
-    is_user_admin = is_admin(update, context)
-    
-    base_commands = (
-        "Comandos del Bot de Listas y Valoraciones:\n\n"
-        "/additem - Añadir un elemento a una lista\n"
-        "/lists - Ver todas las listas disponibles\n"
-        "/viewlist - Ver elementos de una lista específica\n"
-        "/rate - Valorar un elemento (0-10) y añadir comentarios\n"
-        "/ratings - Ver valoraciones y comentarios de elementos\n"
-        "/help - Mostrar este mensaje de ayuda\n"
-        "/cancel - Cancelar la operación actual\n\n"
-        "Consejos para valoraciones:\n"
-        "- Al valorar elementos, puedes añadir un comentario explicando tu valoración\n"
-        "- Usa /skip para omitir añadir un comentario si no quieres explicar tu valoración"
-    )
-    
-    admin_commands = (
-        "\n\nAdmin Commands (only available to chat administrators):\n"
-        "/newlist - Create a new list\n"
-        "/deletelist - Delete a list and all its items\n"
-        "/deleteitem - Delete an item from a list\n"
-        "/deleterating - Delete a specific rating\n"
-        "/clearratings - Clear all ratings for an item"
-    )
-    
     # Show admin commands only if the user is an admin
-    if is_user_admin:
-        update.message.reply_text(base_commands + admin_commands)
+    if await is_admin(update, context, ADMIN_IDS):
+        await update.message.reply_text(_HELP_ADMIN_MSG)
     else:
-        update.message.reply_text(base_commands)
+        await update.message.reply_text(_HELP_MSG)
 
 # List creation handlers
-def new_list(update: Update, context: CallbackContext) -> int:
+async def new_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of creating a new list."""
-    update.message.reply_text(
+    await update.message.reply_text(
         "Let's create a new list! What would you like to name your list?"
     )
-    return CREATE_LIST
+    return State.CREATE_LIST
 
-def create_list(update: Update, context: CallbackContext) -> int:
+async def create_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Create a new list with the provided name."""
     list_name = update.message.text
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
     
     # Check if list name already exists for this user
-    if data_store.list_exists(user_id, list_name):
-        update.message.reply_text(
+    if get_data_store().list_exists(user_id, list_name):
+        await update.message.reply_text(
             f"You already have a list named '{list_name}'. Please choose a different name."
         )
-        return CREATE_LIST
+        return State.CREATE_LIST
     
     # Create the new list
-    data_store.create_list(user_id, list_name)
+    get_data_store().create_list(user_id, list_name)
+    invalidate_cached_list(user_id, list_name, lists_changed=True)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"Great! I've created a new list called '{list_name}'.\n"
         f"You can add items to it with /additem"
     )
     return ConversationHandler.END
 
 # List viewing handlers
-def show_lists(update: Update, context: CallbackContext) -> None:
+async def show_lists(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show all lists created by the user."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
+    user_id = update.effective_user.id
+    lists = get_all_lists_cached(user_id)
     
     if not lists:
-        update.message.reply_text(
+        await update.message.reply_text(
             "You haven't created any lists yet. Use /newlist to create one!"
         )
         return
     
-    message = "Your lists:\n\n"
-    for i, list_name in enumerate(lists, 1):
-        message += f"{i}. {list_name}\n"
+    parts = ["Your lists:\n\n"]
+    parts.extend(f"{i}. {list_name}\n" for i, list_name in enumerate(lists, 1))
     
-    update.message.reply_text(message)
+    await update.message.reply_text("".join(parts))
 
 # Item addition handlers
-def add_item_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of adding an item to a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"add_to_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Choose a list to add an item to:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+add_item_start = make_list_picker("add_to_", "Choose a list to add an item to:", State.SELECT_LIST, "Start the process of adding an item to a list.")
 
-def select_list_for_item(update: Update, context: CallbackContext) -> int:
+async def select_list_for_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for adding an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    list_name = query.data.replace("add_to_", "")
+    list_name = token_name(context, query.data.removeprefix("add_to_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["selected_list"] = list_name
     
-    query.edit_message_text(f"What item would you like to add to '{list_name}'?")
+    await edit_message(query, f"What item would you like to add to '{list_name}'?")
     
-    return ADD_ITEM
+    return State.ADD_ITEM
 
-def add_item_to_list(update: Update, context: CallbackContext) -> int:
+async def add_item_to_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Add an item to the selected list."""
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
     list_name = context.user_data.get("selected_list")
     item_name = update.message.text
     
     if not list_name:
-        update.message.reply_text("Something went wrong. Please try again with /additem")
+        await update.message.reply_text("Something went wrong. Please try again with /additem")
         return ConversationHandler.END
     
     # Check if item already exists in this list
-    if data_store.item_exists(user_id, list_name, item_name):
-        update.message.reply_text(
+    if get_data_store().item_exists(user_id, list_name, item_name):
+        await update.message.reply_text(
             f"'{item_name}' already exists in '{list_name}'. Please add a different item."
         )
-        return ADD_ITEM
+        return State.ADD_ITEM
     
     # Add the item to the list
-    data_store.add_item(user_id, list_name, item_name)
+    get_data_store().add_item(user_id, list_name, item_name)
+    invalidate_cached_list(user_id, list_name)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"Added '{item_name}' to '{list_name}'!\n"
         f"You can rate it with /rate"
     )
@@ -239,551 +541,390 @@ def add_item_to_list(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 # View list items handlers
-def view_list_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of viewing items in a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"view_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Choose a list to view:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+view_list_start = make_list_picker("view_", "Choose a list to view:", State.SELECT_LIST, "Start the process of viewing items in a list.")
 
-def view_list_items(update: Update, context: CallbackContext) -> int:
+async def view_list_items(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show the items in the selected list."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("view_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("view_"))
+    if list_name is None:
+        return await _menu_expired(query)
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_data_store().get_items_with_averages(user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"The list '{list_name}' is empty. Add items with /additem"
         )
     else:
-        message = f"Items in '{list_name}':\n\n"
-        for i, item_data in enumerate(items.items(), 1):
-            item_name, ratings = item_data
+        parts = [f"Items in '{list_name}':\n\n"]
+        for i, (item_name, avg_rating, count) in enumerate(items, 1):
+            avg_rating_text = f"{avg_rating:.1f}" if count else "Not yet rated"
             
-            # Use the get_average_rating helper method
-            avg_rating = data_store.get_average_rating(user_id, list_name, item_name)
-            avg_rating_text = f"{avg_rating:.1f}" if ratings else "Not yet rated"
-            
-            message += f"{i}. {item_name} - Average rating: {avg_rating_text}\n"
+            parts.append(f"{i}. {item_name} - Average rating: {avg_rating_text}\n")
         
-        query.edit_message_text(message)
+        await edit_message(query, "".join(parts))
     
     return ConversationHandler.END
 
 # Rating handlers
-def rate_item_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of rating an item."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"rate_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Choose a list that contains the item you want to rate:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+rate_item_start = make_list_picker("rate_list_", "Choose a list that contains the item you want to rate:", State.SELECT_LIST, "Start the process of rating an item.")
 
-def select_list_for_rating(update: Update, context: CallbackContext) -> int:
+async def select_list_for_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for rating an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("rate_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("rate_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["rating_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"The list '{list_name}' is empty. Add items with /additem"
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"rate_item_{item_name}")])
+    names = tuple(items)
+    reply_markup = _name_keyboard(context, "rate_item_", names)
+    await edit_message(query, f"Choose an item from '{list_name}' to rate:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "rate_item_", names)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"Choose an item from '{list_name}' to rate:", reply_markup=reply_markup)
-    
-    return SELECTING_ITEM_TO_RATE
+    return State.SELECTING_ITEM_TO_RATE
 
-def select_item_for_rating(update: Update, context: CallbackContext) -> int:
+async def select_item_for_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the item selection for rating."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    item_name = query.data.replace("rate_item_", "")
+    item_name = token_name(context, query.data.removeprefix("rate_item_"))
+    if item_name is None:
+        return await _menu_expired(query)
     context.user_data["rating_item"] = item_name
     
     # Create rating keyboard with buttons 0-10
-    keyboard = []
-    row = []
-    for i in range(11):  # 0 to 10
-        row.append(InlineKeyboardButton(str(i), callback_data=f"give_rating_{i}"))
-        if len(row) == 4 or i == 10:  # 4 buttons per row, or last button
-            keyboard.append(row.copy())
-            row = []
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _RATING_KEYBOARD
+    await edit_message(
+        query,
         f"Rate '{item_name}' on a scale from 0 to 10:",
         reply_markup=reply_markup
     )
     
-    return RATE_ITEM
+    return State.RATE_ITEM
 
-def apply_rating(update: Update, context: CallbackContext) -> int:
+async def apply_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Store the rating and ask for a comment."""
+    user_data = context.user_data
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("rating_list")
-    item_name = context.user_data.get("rating_item")
-    rating = int(query.data.replace("give_rating_", ""))
+    user_id = query.from_user.id
+    list_name = user_data.get("rating_list")
+    item_name = user_data.get("rating_item")
+    rating = int(query.data.removeprefix("give_rating_"))
     
-    if not all([list_name, item_name]):
-        query.edit_message_text("Something went wrong. Please try again with /rate")
+    if list_name is None or item_name is None:
+        await edit_message(query, "Something went wrong. Please try again with /rate")
         return ConversationHandler.END
     
     # Store the rating in user_data temporarily
-    context.user_data["temp_rating"] = rating
+    user_data["temp_rating"] = rating
     
     # Ask for a comment
-    query.edit_message_text(
+    await edit_message(
+        query,
         f"You're giving '{item_name}' a {rating}/10!\n\n"
         f"Would you like to add a comment about why you gave this rating?\n"
         f"Type your comment or send /skip to continue without a comment."
     )
     
-    return ADD_COMMENT
+    return State.ADD_COMMENT
     
-def add_rating_comment(update: Update, context: CallbackContext) -> int:
+async def add_rating_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Apply the rating with the user's comment."""
+    user_data = context.user_data
     comment = update.message.text
-    user_id = str(update.effective_user.id)
-    list_name = context.user_data.get("rating_list")
-    item_name = context.user_data.get("rating_item")
-    rating = context.user_data.get("temp_rating")
+    user_id = update.effective_user.id
+    list_name = user_data.get("rating_list")
+    item_name = user_data.get("rating_item")
+    rating = user_data.get("temp_rating")
     
-    if not all([list_name, item_name, rating is not None]):
-        update.message.reply_text("Something went wrong. Please try again with /rate")
+    if list_name is None or item_name is None or rating is None:
+        await update.message.reply_text("Something went wrong. Please try again with /rate")
         return ConversationHandler.END
     
     # Add the rating with comment to the item
-    data_store.add_rating(user_id, list_name, item_name, rating, comment)
+    get_data_store().add_rating(user_id, list_name, item_name, rating, comment)
+    invalidate_cached_list(user_id, list_name)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"You rated '{item_name}' a {rating}/10 with the comment:\n\n"
         f"\"{comment}\""
     )
     
     return ConversationHandler.END
     
-def skip_comment(update: Update, context: CallbackContext) -> int:
+async def skip_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Skip adding a comment and just save the rating."""
-    user_id = str(update.effective_user.id)
-    list_name = context.user_data.get("rating_list")
-    item_name = context.user_data.get("rating_item")
-    rating = context.user_data.get("temp_rating")
+    user_data = context.user_data
+    user_id = update.effective_user.id
+    list_name = user_data.get("rating_list")
+    item_name = user_data.get("rating_item")
+    rating = user_data.get("temp_rating")
     
-    if not all([list_name, item_name, rating is not None]):
-        update.message.reply_text("Something went wrong. Please try again with /rate")
+    if list_name is None or item_name is None or rating is None:
+        await update.message.reply_text("Something went wrong. Please try again with /rate")
         return ConversationHandler.END
     
     # Add the rating without comment
-    data_store.add_rating(user_id, list_name, item_name, rating)
+    get_data_store().add_rating(user_id, list_name, item_name, rating)
+    invalidate_cached_list(user_id, list_name)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"You rated '{item_name}' a {rating}/10 without a comment."
     )
     
     return ConversationHandler.END
 
 # View ratings handlers
-def view_ratings_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of viewing ratings for items in a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"ratings_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Choose a list to view ratings:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+view_ratings_start = make_list_picker("ratings_", "Choose a list to view ratings:", State.SELECT_LIST, "Start the process of viewing ratings for items in a list.")
 
-def view_list_ratings(update: Update, context: CallbackContext) -> int:
+async def view_list_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show the ratings for items in the selected list."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("ratings_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("ratings_"))
+    if list_name is None:
+        return await _menu_expired(query)
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"The list '{list_name}' is empty. Add items with /additem"
         )
     else:
-        message = f"Ratings for items in '{list_name}':\n\n"
-        for item_name, ratings in items.items():
-            if ratings:
-                # Use the get_average_rating helper method
-                avg_rating = data_store.get_average_rating(user_id, list_name, item_name)
-                
-                message += f"• {item_name}\n"
-                message += f"  Average: {avg_rating:.1f}/10\n"
-                message += f"  All ratings:\n"
-                
-                # Show each rating with its comment if available
-                for i, (rating, comment) in enumerate(ratings, 1):
-                    message += f"    {i}. {rating}/10"
-                    if comment:
-                        message += f" - \"{comment}\""
-                    message += "\n"
-                message += "\n"
-            else:
-                message += f"• {item_name}: Not yet rated\n\n"
+        messages = paginate(rating_lines(list_name, items, _RATING_TEXTS), MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGES, TRUNCATED_NOTE)
         
-        # If message is too long, split it
-        if len(message) > 4000:  # Telegram message limit is around 4096 characters
-            message = message[:3950] + "\n\n... (message truncated due to length)"
-            
-        query.edit_message_text(message)
+        # The first page replaces the menu; any further pages follow in order
+        await edit_message(query, messages[0])
+        for message in messages[1:]:
+            await context.bot.send_message(query.message.chat_id, message)
     
     return ConversationHandler.END
 
 # Delete list handlers
-@admin_required
-def delete_list_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of deleting a list. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"delete_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("⚠️ Choose a list to DELETE:", reply_markup=reply_markup)
-    
-    return DELETE_LIST
+delete_list_start = admin_required(make_list_picker("delete_list_", "⚠️ Choose a list to DELETE:", State.DELETE_LIST, "Start the process of deleting a list. Admin only."))
 
-def confirm_delete_list(update: Update, context: CallbackContext) -> int:
+async def confirm_delete_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ask for confirmation before deleting a list."""
     query = update.callback_query
-    query.answer()
-    
-    list_name = query.data.replace("delete_list_", "")
-    context.user_data["delete_list_name"] = list_name
+    await query.answer()
     
-    keyboard = [
-        [InlineKeyboardButton("Yes, delete this list", callback_data="confirm_delete_list")],
-        [InlineKeyboardButton("No, keep this list", callback_data="cancel_delete")]
-    ]
+    list_name = token_name(context, query.data.removeprefix("delete_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
+    context.user_data["pending_action"] = ("delete_list", (list_name,))
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _CONFIRM_DELETE_LIST_KEYBOARD
+    await edit_message(
+        query,
         f"⚠️ Are you sure you want to delete the list '{list_name}' and all its items and ratings?\n\n"
         "This action cannot be undone!",
         reply_markup=reply_markup
     )
     
-    return CONFIRM_DELETE
+    return State.CONFIRM_DELETE
 
-def execute_delete_list(update: Update, context: CallbackContext) -> int:
-    """Delete the selected list after confirmation."""
+async def execute_confirmed_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Carry out the deletion waiting for confirmation, or cancel it."""
     query = update.callback_query
-    query.answer()
     
-    if query.data == "cancel_delete":
-        query.edit_message_text("Deletion cancelled. Your list is safe.")
+    pending = context.user_data.pop("pending_action", None)
+    if pending is None:
+        await _answer_and_edit(query, "Something went wrong. Please start again.")
         return ConversationHandler.END
     
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("delete_list_name")
+    action, args = pending
+    operation, lists_changed, done_msg, failed_msg, cancelled_msg = _CONFIRMED_ACTIONS[action]
     
-    if not list_name:
-        query.edit_message_text("Something went wrong. Please try again with /deletelist")
+    if query.data.startswith("cancel_"):
+        await _answer_and_edit(query, cancelled_msg)
         return ConversationHandler.END
     
-    # Delete the list
-    success = data_store.delete_list(user_id, list_name)
+    user_id = query.from_user.id
+    result = operation(get_data_store(), user_id, *args)
+    invalidate_cached_list(user_id, args[0], lists_changed)
     
-    if success:
-        query.edit_message_text(f"The list '{list_name}' has been deleted.")
-    else:
-        query.edit_message_text(f"Failed to delete the list '{list_name}'. Please try again later.")
+    message = done_msg if result else failed_msg
+    await _answer_and_edit(query, message.format(*args, result=result))
     
     return ConversationHandler.END
 
 # Delete item handlers
-@admin_required
-def delete_item_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of deleting an item. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"delete_item_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Choose a list that contains the item you want to delete:", reply_markup=reply_markup)
-    
-    return DELETE_LIST
+delete_item_start = admin_required(make_list_picker("delete_item_list_", "Choose a list that contains the item you want to delete:", State.DELETE_LIST, "Start the process of deleting an item. Admin only."))
 
-def select_list_for_delete_item(update: Update, context: CallbackContext) -> int:
+async def select_list_for_delete_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for deleting an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("delete_item_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("delete_item_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["delete_item_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"The list '{list_name}' is empty. Add items with /additem"
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"delete_item_{item_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"⚠️ Choose an item from '{list_name}' to DELETE:", reply_markup=reply_markup)
+    names = tuple(items)
+    reply_markup = _name_keyboard(context, "delete_item_", names)
+    await edit_message(query, f"⚠️ Choose an item from '{list_name}' to DELETE:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "delete_item_", names)
     
-    return DELETE_ITEM
+    return State.DELETE_ITEM
 
-def confirm_delete_item(update: Update, context: CallbackContext) -> int:
+async def confirm_delete_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ask for confirmation before deleting an item."""
+    user_data = context.user_data
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    item_name = query.data.replace("delete_item_", "")
-    list_name = context.user_data.get("delete_item_list")
+    item_name = token_name(context, query.data.removeprefix("delete_item_"))
+    if item_name is None:
+        return await _menu_expired(query)
+    list_name = user_data.get("delete_item_list")
     
     if not list_name:
-        query.edit_message_text("Something went wrong. Please try again with /deleteitem")
+        await edit_message(query, "Something went wrong. Please try again with /deleteitem")
         return ConversationHandler.END
     
-    context.user_data["delete_item_name"] = item_name
-    
-    keyboard = [
-        [InlineKeyboardButton("Yes, delete this item", callback_data="confirm_delete_item")],
-        [InlineKeyboardButton("No, keep this item", callback_data="cancel_delete")]
-    ]
+    user_data["pending_action"] = ("delete_item", (list_name, item_name))
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _CONFIRM_DELETE_ITEM_KEYBOARD
+    await edit_message(
+        query,
         f"⚠️ Are you sure you want to delete the item '{item_name}' from the list '{list_name}'?\n\n"
         "This will delete all ratings and comments for this item. This action cannot be undone!",
         reply_markup=reply_markup
     )
     
-    return CONFIRM_DELETE
-
-def execute_delete_item(update: Update, context: CallbackContext) -> int:
-    """Delete the selected item after confirmation."""
-    query = update.callback_query
-    query.answer()
-    
-    if query.data == "cancel_delete":
-        query.edit_message_text("Deletion cancelled. Your item is safe.")
-        return ConversationHandler.END
-    
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("delete_item_list")
-    item_name = context.user_data.get("delete_item_name")
-    
-    if not all([list_name, item_name]):
-        query.edit_message_text("Something went wrong. Please try again with /deleteitem")
-        return ConversationHandler.END
-    
-    # Delete the item
-    success = data_store.delete_item(user_id, list_name, item_name)
-    
-    if success:
-        query.edit_message_text(f"The item '{item_name}' has been deleted from the list '{list_name}'.")
-    else:
-        query.edit_message_text(f"Failed to delete the item '{item_name}'. Please try again later.")
-    
-    return ConversationHandler.END
+    return State.CONFIRM_DELETE
 
 # Delete rating handlers
-@admin_required
-def delete_rating_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of deleting a rating. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"delete_rating_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Choose a list that contains the item with ratings you want to delete:", reply_markup=reply_markup)
-    
-    return DELETE_LIST
+delete_rating_start = admin_required(make_list_picker("delete_rating_list_", "Choose a list that contains the item with ratings you want to delete:", State.DELETE_LIST, "Start the process of deleting a rating. Admin only."))
 
-def select_list_for_delete_rating(update: Update, context: CallbackContext) -> int:
+async def select_list_for_delete_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for deleting a rating."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("delete_rating_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("delete_rating_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["delete_rating_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
-    items_with_ratings = {item: ratings for item, ratings in items.items() if ratings}
+    items = get_list_items_cached(user_id, list_name)
+    rated = tuple(item for item, ratings in items.items() if ratings)
     
-    if not items_with_ratings:
-        query.edit_message_text(
+    if not rated:
+        await edit_message(
+            query,
             f"No items in the list '{list_name}' have ratings yet."
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items_with_ratings:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"delete_rating_item_{item_name}")])
+    reply_markup = _name_keyboard(context, "delete_rating_item_", rated)
+    await edit_message(query, f"Choose an item from '{list_name}' with ratings to delete:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "delete_rating_item_", rated)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"Choose an item from '{list_name}' with ratings to delete:", reply_markup=reply_markup)
-    
-    return DELETE_ITEM
+    return State.DELETE_ITEM
 
-def select_item_for_delete_rating(update: Update, context: CallbackContext) -> int:
+async def select_item_for_delete_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the item selection for deleting a rating."""
+    user_data = context.user_data
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    item_name = query.data.replace("delete_rating_item_", "")
-    list_name = context.user_data.get("delete_rating_list")
+    user_id = query.from_user.id
+    item_name = token_name(context, query.data.removeprefix("delete_rating_item_"))
+    if item_name is None:
+        return await _menu_expired(query)
+    list_name = user_data.get("delete_rating_list")
     
     if not list_name:
-        query.edit_message_text("Something went wrong. Please try again with /deleterating")
+        await edit_message(query, "Something went wrong. Please try again with /deleterating")
         return ConversationHandler.END
     
-    context.user_data["delete_rating_item"] = item_name
+    user_data["delete_rating_item"] = item_name
     
-    ratings = data_store.get_item_ratings(user_id, list_name, item_name)
-    
-    keyboard = []
-    for i, (rating, comment) in enumerate(ratings):
-        display_text = f"{rating}/10"
-        if comment:
-            # Truncate long comments for the button
-            display_comment = comment if len(comment) <= 20 else comment[:17] + "..."
-            display_text += f" - \"{display_comment}\""
-        
-        keyboard.append([InlineKeyboardButton(display_text, callback_data=f"delete_rating_{i}")])
+    ratings = get_data_store().get_item_ratings(user_id, list_name, item_name)
     
+    keyboard = [
+        [InlineKeyboardButton(_rating_label(rating, comment), callback_data=f"delete_rating_{i}")]
+        for i, (rating, comment) in enumerate(ratings)
+    ]
     keyboard.append([InlineKeyboardButton("Delete ALL ratings", callback_data="delete_all_ratings")])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    await edit_message(
+        query,
         f"⚠️ Choose a rating to DELETE for the item '{item_name}':",
         reply_markup=reply_markup
     )
     
-    return DELETE_RATING
+    return State.DELETE_RATING
 
-def confirm_delete_rating(update: Update, context: CallbackContext) -> int:
+async def confirm_delete_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ask for confirmation before deleting a rating."""
+    user_data = context.user_data
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("delete_rating_list")
-    item_name = context.user_data.get("delete_rating_item")
+    user_id = query.from_user.id
+    list_name = user_data.get("delete_rating_list")
+    item_name = user_data.get("delete_rating_item")
     
-    if not all([list_name, item_name]):
-        query.edit_message_text("Something went wrong. Please try again with /deleterating")
+    if list_name is None or item_name is None:
+        await edit_message(query, "Something went wrong. Please try again with /deleterating")
         return ConversationHandler.END
     
     if query.data == "delete_all_ratings":
-        context.user_data["delete_all_ratings"] = True
-        
-        keyboard = [
-            [InlineKeyboardButton("Yes, delete ALL ratings", callback_data="confirm_delete_rating")],
-            [InlineKeyboardButton("No, keep the ratings", callback_data="cancel_delete")]
-        ]
+        user_data["pending_action"] = ("delete_all_ratings", (list_name, item_name))
         
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.edit_message_text(
+        reply_markup = _CONFIRM_DELETE_ALL_RATINGS_KEYBOARD
+        await edit_message(
+            query,
             f"⚠️ Are you sure you want to delete ALL ratings for the item '{item_name}'?\n\n"
             "This action cannot be undone!",
             reply_markup=reply_markup
         )
         
     else:
-        rating_index = int(query.data.replace("delete_rating_", ""))
-        context.user_data["delete_rating_index"] = rating_index
+        rating_index = int(query.data.removeprefix("delete_rating_"))
+        user_data["pending_action"] = ("delete_rating", (list_name, item_name, rating_index))
         
-        ratings = data_store.get_item_ratings(user_id, list_name, item_name)
+        ratings = get_data_store().get_item_ratings(user_id, list_name, item_name)
         rating, comment = ratings[rating_index]
         
         # Format the rating information for display
@@ -791,291 +932,224 @@ def confirm_delete_rating(update: Update, context: CallbackContext) -> int:
         if comment:
             rating_info += f" with comment: \"{comment}\""
         
-        keyboard = [
-            [InlineKeyboardButton("Yes, delete this rating", callback_data="confirm_delete_rating")],
-            [InlineKeyboardButton("No, keep this rating", callback_data="cancel_delete")]
-        ]
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        query.edit_message_text(
+        reply_markup = _CONFIRM_DELETE_RATING_KEYBOARD
+        await edit_message(
+            query,
             f"⚠️ Are you sure you want to delete the rating ({rating_info}) for the item '{item_name}'?\n\n"
             "This action cannot be undone!",
             reply_markup=reply_markup
         )
     
-    return CONFIRM_DELETE
-
-def execute_delete_rating(update: Update, context: CallbackContext) -> int:
-    """Delete the selected rating after confirmation."""
-    query = update.callback_query
-    query.answer()
-    
-    if query.data == "cancel_delete":
-        query.edit_message_text("Deletion cancelled. The rating is safe.")
-        return ConversationHandler.END
-    
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("delete_rating_list")
-    item_name = context.user_data.get("delete_rating_item")
-    
-    if not all([list_name, item_name]):
-        query.edit_message_text("Something went wrong. Please try again with /deleterating")
-        return ConversationHandler.END
-    
-    # Check if we're deleting all ratings or just one
-    if context.user_data.get("delete_all_ratings", False):
-        success = data_store.clear_ratings(user_id, list_name, item_name)
-        message = f"All ratings for the item '{item_name}' have been deleted."
-    else:
-        rating_index = context.user_data.get("delete_rating_index")
-        if rating_index is None:
-            query.edit_message_text("Something went wrong. Please try again with /deleterating")
-            return ConversationHandler.END
-            
-        success = data_store.delete_rating(user_id, list_name, item_name, rating_index)
-        message = f"The selected rating for the item '{item_name}' has been deleted."
-    
-    if success:
-        query.edit_message_text(message)
-    else:
-        query.edit_message_text("Failed to delete the rating. Please try again later.")
-    
-    return ConversationHandler.END
+    return State.CONFIRM_DELETE
 
 # Clear all ratings for an item
-@admin_required
-def clear_ratings_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of clearing all ratings for an item. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "You don't have any lists yet. Create one first with /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"clear_ratings_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Choose a list that contains the item with ratings you want to clear:", reply_markup=reply_markup)
-    
-    return DELETE_LIST
+clear_ratings_start = admin_required(make_list_picker("clear_ratings_list_", "Choose a list that contains the item with ratings you want to clear:", State.DELETE_LIST, "Start the process of clearing all ratings for an item. Admin only."))
 
-def select_list_for_clear_ratings(update: Update, context: CallbackContext) -> int:
+async def select_list_for_clear_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for clearing ratings."""
     query = update.callback_query
-    query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("clear_ratings_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("clear_ratings_list_"))
+    if list_name is None:
+        return await _menu_expired(query, answer=True)
     context.user_data["clear_ratings_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
-    items_with_ratings = {item: ratings for item, ratings in items.items() if ratings}
+    items = get_list_items_cached(user_id, list_name)
+    rated = tuple(item for item, ratings in items.items() if ratings)
     
-    if not items_with_ratings:
-        query.edit_message_text(
+    if not rated:
+        await _answer_and_edit(
+            query,
             f"No items in the list '{list_name}' have ratings yet."
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items_with_ratings:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"clear_ratings_item_{item_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"Choose an item from '{list_name}' to clear all ratings:", reply_markup=reply_markup)
+    reply_markup = _name_keyboard(context, "clear_ratings_item_", rated)
+    await _answer_and_edit(query, f"Choose an item from '{list_name}' to clear all ratings:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "clear_ratings_item_", rated)
     
-    return DELETE_ITEM
+    return State.DELETE_ITEM
 
-def confirm_clear_ratings(update: Update, context: CallbackContext) -> int:
-    """Ask for confirmation before clearing all ratings for an item."""
+async def confirm_clear_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Ask for confirmation before clearing all ratings for an item, or for every rated item."""
+    user_data = context.user_data
     query = update.callback_query
-    query.answer()
-    
-    item_name = query.data.replace("clear_ratings_item_", "")
-    list_name = context.user_data.get("clear_ratings_list")
     
+    list_name = user_data.get("clear_ratings_list")
     if not list_name:
-        query.edit_message_text("Something went wrong. Please try again with /clearratings")
+        await _answer_and_edit(query, "Something went wrong. Please try again with /clearratings")
         return ConversationHandler.END
     
-    context.user_data["clear_ratings_item"] = item_name
+    reply_markup = _CONFIRM_CLEAR_RATINGS_KEYBOARD
+    if query.data == "clear_ratings_all":
+        items = get_list_items_cached(query.from_user.id, list_name)
+        rated = [item for item, ratings in items.items() if ratings]
+        user_data["pending_action"] = ("clear_all_ratings", (list_name, rated))
+        await _answer_and_edit(
+            query,
+            f"⚠️ Are you sure you want to clear ALL ratings for every item in the list '{list_name}'?\n\n"
+            "This will delete all ratings and comments in this list. This action cannot be undone!",
+            reply_markup=reply_markup
+        )
+        return State.CONFIRM_DELETE
     
-    keyboard = [
-        [InlineKeyboardButton("Yes, clear ALL ratings", callback_data="confirm_clear_ratings")],
-        [InlineKeyboardButton("No, keep the ratings", callback_data="cancel_clear")]
-    ]
+    item_name = token_name(context, query.data.removeprefix("clear_ratings_item_"))
+    if item_name is None:
+        return await _menu_expired(query, answer=True)
     
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    user_data["pending_action"] = ("clear_ratings", (list_name, item_name))
+    
+    await _answer_and_edit(
+        query,
         f"⚠️ Are you sure you want to clear ALL ratings for the item '{item_name}'?\n\n"
         "This will delete all ratings and comments for this item. This action cannot be undone!",
         reply_markup=reply_markup
     )
     
-    return CONFIRM_DELETE
-
-def execute_clear_ratings(update: Update, context: CallbackContext) -> int:
-    """Clear all ratings for the selected item after confirmation."""
-    query = update.callback_query
-    query.answer()
-    
-    if query.data == "cancel_clear":
-        query.edit_message_text("Operation cancelled. Your ratings are safe.")
-        return ConversationHandler.END
-    
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("clear_ratings_list")
-    item_name = context.user_data.get("clear_ratings_item")
-    
-    if not all([list_name, item_name]):
-        query.edit_message_text("Something went wrong. Please try again with /clearratings")
-        return ConversationHandler.END
-    
-    # Clear all ratings
-    success = data_store.clear_ratings(user_id, list_name, item_name)
-    
-    if success:
-        query.edit_message_text(f"All ratings for the item '{item_name}' have been cleared.")
-    else:
-        query.edit_message_text(f"Failed to clear ratings for the item '{item_name}'. Please try again later.")
-    
-    return ConversationHandler.END
+    return State.CONFIRM_DELETE
 
 # Cancel handler
-def cancel(update: Update, context: CallbackContext) -> int:
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the current conversation."""
-    update.message.reply_text("Operation cancelled.")
+    await update.message.reply_text("Operation cancelled.")
     return ConversationHandler.END
 
-def setup_handlers(dispatcher):
-    """Set up the Telegram bot handlers on an existing dispatcher."""
-    # This function is used by bot_main.py when starting the bot in standalone mode
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Log errors raised while processing updates."""
+    # Only the update id is logged: formatting the whole Update is slow and
+    # would copy message contents into the log
+    update_id = update.update_id if isinstance(update, Update) else None
+    logger.error("Update %s caused error: %s", update_id, context.error, exc_info=context.error)
+
+# Shared by every conversation: /cancel, and Prev/Next in any list or item menu
+_CONVERSATION_FALLBACKS = [
+    CommandHandler("cancel", cancel),
+    CallbackQueryHandler(turn_menu_page, pattern=MENU_PAGE_PATTERN)
+]
+
+def _conversation(command: str, entry_point, states: dict, persistent: bool = False) -> ConversationHandler:
+    """
+    Build a conversation started by a command, with the shared fallbacks.
     
-    # Create list conversation (admin only)
-    create_list_handler = ConversationHandler(
-        entry_points=[CommandHandler("newlist", new_list)],
-        states={
-            CREATE_LIST: [MessageHandler(Filters.text & ~Filters.command, create_list)]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
+    Args:
+        command: Command that starts the conversation
+        entry_point: Handler for that command
+        states: Conversation states mapped to their handlers
+        persistent: Whether to store the conversation state in the application's persistence
+        
+    Returns:
+        ConversationHandler: The conversation handler
+    """
+    return ConversationHandler(
+        entry_points=[CommandHandler(command, entry_point)],
+        states=states,
+        fallbacks=_CONVERSATION_FALLBACKS,
+        name=f"{command}_conversation",
+        persistent=persistent
     )
+
+def setup_handlers(application: Application) -> None:
+    """Set up the Telegram bot handlers on an existing application."""
+    # This function is used by cli.py when starting the bot in standalone mode
+    
+    # Conversations can only resume after a restart if the application persists its state
+    persistent = application.persistence is not None
+    
+    # Every Yes/No confirmation is answered by the same handler
+    confirmation_handler = CallbackQueryHandler(execute_confirmed_action, pattern=_CONFIRMATION_PATTERN)
+    
+    # Create list conversation (admin only)
+    create_list_handler = _conversation("newlist", new_list, {
+        State.CREATE_LIST: [MessageHandler(TEXT_MESSAGE, create_list)]
+    }, persistent)
     
     # Add item conversation
-    add_item_handler = ConversationHandler(
-        entry_points=[CommandHandler("additem", add_item_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(select_list_for_item, pattern="^add_to_")],
-            ADD_ITEM: [MessageHandler(Filters.text & ~Filters.command, add_item_to_list)]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
+    add_item_handler = _conversation("additem", add_item_start, {
+        State.SELECT_LIST: [CallbackQueryHandler(select_list_for_item, pattern=_ADD_TO_PATTERN)],
+        State.ADD_ITEM: [MessageHandler(TEXT_MESSAGE, add_item_to_list)]
+    }, persistent)
     
     # View list conversation
-    view_list_handler = ConversationHandler(
-        entry_points=[CommandHandler("viewlist", view_list_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(view_list_items, pattern="^view_")]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
+    view_list_handler = _conversation("viewlist", view_list_start, {
+        State.SELECT_LIST: [CallbackQueryHandler(view_list_items, pattern=_VIEW_PATTERN)]
+    }, persistent)
     
     # Rate item conversation
-    rate_item_handler = ConversationHandler(
-        entry_points=[CommandHandler("rate", rate_item_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(select_list_for_rating, pattern="^rate_list_")],
-            SELECTING_ITEM_TO_RATE: [CallbackQueryHandler(select_item_for_rating, pattern="^rate_item_")],
-            RATE_ITEM: [CallbackQueryHandler(apply_rating, pattern="^give_rating_")],
-            ADD_COMMENT: [
-                MessageHandler(Filters.text & ~Filters.command, add_rating_comment),
-                CommandHandler("skip", skip_comment)
-            ]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
+    rate_item_handler = _conversation("rate", rate_item_start, {
+        State.SELECT_LIST: [CallbackQueryHandler(select_list_for_rating, pattern=_RATE_LIST_PATTERN)],
+        State.SELECTING_ITEM_TO_RATE: [CallbackQueryHandler(select_item_for_rating, pattern=_RATE_ITEM_PATTERN)],
+        State.RATE_ITEM: [CallbackQueryHandler(apply_rating, pattern=_GIVE_RATING_PATTERN)],
+        State.ADD_COMMENT: [
+            MessageHandler(TEXT_MESSAGE, add_rating_comment),
+            CommandHandler("skip", skip_comment)
+        ]
+    }, persistent)
     
     # View ratings conversation
-    view_ratings_handler = ConversationHandler(
-        entry_points=[CommandHandler("ratings", view_ratings_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(view_list_ratings, pattern="^ratings_")]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
+    view_ratings_handler = _conversation("ratings", view_ratings_start, {
+        State.SELECT_LIST: [CallbackQueryHandler(view_list_ratings, pattern=_RATINGS_PATTERN)]
+    }, persistent)
     
     # Delete list conversation (admin only)
-    delete_list_handler = ConversationHandler(
-        entry_points=[CommandHandler("deletelist", delete_list_start)],
-        states={
-            DELETE_LIST: [CallbackQueryHandler(confirm_delete_list, pattern="^delete_list_")],
-            CONFIRM_DELETE: [CallbackQueryHandler(execute_delete_list, pattern="^(confirm_delete_list|cancel_delete)$")]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
+    delete_list_handler = _conversation("deletelist", delete_list_start, {
+        State.DELETE_LIST: [CallbackQueryHandler(confirm_delete_list, pattern=_DELETE_LIST_PATTERN)],
+        State.CONFIRM_DELETE: [confirmation_handler]
+    }, persistent)
     
     # Delete item conversation (admin only)
-    delete_item_handler = ConversationHandler(
-        entry_points=[CommandHandler("deleteitem", delete_item_start)],
-        states={
-            DELETE_LIST: [CallbackQueryHandler(select_list_for_delete_item, pattern="^delete_item_list_")],
-            DELETE_ITEM: [CallbackQueryHandler(confirm_delete_item, pattern="^delete_item_")],
-            CONFIRM_DELETE: [CallbackQueryHandler(execute_delete_item, pattern="^(confirm_delete_item|cancel_delete)$")]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
+    delete_item_handler = _conversation("deleteitem", delete_item_start, {
+        State.DELETE_LIST: [CallbackQueryHandler(select_list_for_delete_item, pattern=_DELETE_ITEM_LIST_PATTERN)],
+        State.DELETE_ITEM: [CallbackQueryHandler(confirm_delete_item, pattern=_DELETE_ITEM_PATTERN)],
+        State.CONFIRM_DELETE: [confirmation_handler]
+    }, persistent)
     
     # Delete rating conversation (admin only)
-    delete_rating_handler = ConversationHandler(
-        entry_points=[CommandHandler("deleterating", delete_rating_start)],
-        states={
-            DELETE_LIST: [CallbackQueryHandler(select_list_for_delete_rating, pattern="^delete_rating_list_")],
-            DELETE_ITEM: [CallbackQueryHandler(select_item_for_delete_rating, pattern="^delete_rating_item_")],
-            DELETE_RATING: [CallbackQueryHandler(confirm_delete_rating, pattern="^(delete_rating_|delete_all_ratings)")],
-            CONFIRM_DELETE: [CallbackQueryHandler(execute_delete_rating, pattern="^(confirm_delete_rating|cancel_delete)$")]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
+    delete_rating_handler = _conversation("deleterating", delete_rating_start, {
+        State.DELETE_LIST: [CallbackQueryHandler(select_list_for_delete_rating, pattern=_DELETE_RATING_LIST_PATTERN)],
+        State.DELETE_ITEM: [CallbackQueryHandler(select_item_for_delete_rating, pattern=_DELETE_RATING_ITEM_PATTERN)],
+        State.DELETE_RATING: [CallbackQueryHandler(confirm_delete_rating, pattern=_DELETE_RATING_PATTERN)],
+        State.CONFIRM_DELETE: [confirmation_handler]
+    }, persistent)
     
     # Clear ratings conversation (admin only)
-    clear_ratings_handler = ConversationHandler(
-        entry_points=[CommandHandler("clearratings", clear_ratings_start)],
-        states={
-            DELETE_LIST: [CallbackQueryHandler(select_list_for_clear_ratings, pattern="^clear_ratings_list_")],
-            DELETE_ITEM: [CallbackQueryHandler(confirm_clear_ratings, pattern="^clear_ratings_item_")],
-            CONFIRM_DELETE: [CallbackQueryHandler(execute_clear_ratings, pattern="^(confirm_clear_ratings|cancel_clear)$")]
-        },
-        fallbacks=[CommandHandler("cancel", cancel)]
-    )
-    
-    # Add basic command handlers
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help_command))
-    dispatcher.add_handler(CommandHandler("lists", show_lists))
-    
-    # Add user conversation handlers
-    dispatcher.add_handler(add_item_handler)
-    dispatcher.add_handler(view_list_handler)
-    dispatcher.add_handler(rate_item_handler)
-    dispatcher.add_handler(view_ratings_handler)
-    
-    # Add admin conversation handlers
-    dispatcher.add_handler(create_list_handler)  # Admin-only
-    dispatcher.add_handler(delete_list_handler)  # Admin-only
-    dispatcher.add_handler(delete_item_handler)  # Admin-only
-    dispatcher.add_handler(delete_rating_handler)  # Admin-only
-    dispatcher.add_handler(clear_ratings_handler)  # Admin-only
+    clear_ratings_handler = _conversation("clearratings", clear_ratings_start, {
+        State.DELETE_LIST: [CallbackQueryHandler(select_list_for_clear_ratings, pattern=_CLEAR_RATINGS_LIST_PATTERN)],
+        State.DELETE_ITEM: [CallbackQueryHandler(confirm_clear_ratings, pattern=_CLEAR_RATINGS_ITEM_PATTERN)],
+        State.CONFIRM_DELETE: [confirmation_handler]
+    }, persistent)
+    
+    # PTB checks handlers in order until one matches, so the conversations that
+    # receive most callback queries and text messages come first. Everything
+    # stays in one group: splitting groups would make every update run through
+    # each group instead of stopping at the first match.
+    application.add_handlers([
+        # User conversations, busiest first
+        rate_item_handler,
+        view_ratings_handler,
+        view_list_handler,
+        add_item_handler,
+        
+        # Basic commands
+        CommandHandler("start", start),
+        CommandHandler("help", help_command),
+        CommandHandler("lists", show_lists),
+        
+        # Admin conversations
+        create_list_handler,
+        delete_list_handler,
+        delete_item_handler,
+        delete_rating_handler,
+        clear_ratings_handler,
+        
+        # Keep the admin cache in sync with role changes
+        ChatMemberHandler(chat_member_updated, ChatMemberHandler.CHAT_MEMBER)
+    ])
     
     # Log all errors
-    dispatcher.add_error_handler(lambda update, context: logger.error(
-        f"Update {update} caused error: {context.error}"
-    ))
+    application.add_error_handler(error_handler)
 
-def setup_bot():
+def setup_bot() -> Application:
     """Set up the Telegram bot with all handlers."""
     # Get telegram token from environment
     telegram_token = os.environ.get("TELEGRAM_TOKEN")
@@ -1083,12 +1157,29 @@ def setup_bot():
         logger.error("TELEGRAM_TOKEN environment variable is not set")
         raise ValueError("TELEGRAM_TOKEN environment variable is required")
     
-    # Create the updater and dispatcher
-    updater = Updater(token=telegram_token)
-    dispatcher = updater.dispatcher
+    # Handle up to CONCURRENT_UPDATES updates at once so users don't wait on each other
+    # The connection pool is sized well above CONCURRENT_UPDATES so replies from
+    # concurrent handlers never queue for a free HTTP connection
+    builder = (
+        ApplicationBuilder()
+        .token(telegram_token)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .connection_pool_size(CONNECTION_POOL_SIZE)
+        .http_version(HTTP_VERSION)
+        .connect_timeout(CONNECT_TIMEOUT)
+        .pool_timeout(POOL_TIMEOUT)
+        .read_timeout(READ_TIMEOUT)
+        .write_timeout(WRITE_TIMEOUT)
+        .get_updates_connection_pool_size(GET_UPDATES_POOL_SIZE)
+    )
+    if BOT_STATE_PATH:
+        builder = builder.persistence(
+            PicklePersistence(BOT_STATE_PATH, store_data=PERSISTED_DATA, update_interval=PERSISTENCE_INTERVAL)
+        )
+    application = builder.build()
     
     # Use the shared setup_handlers function to set up all handlers
-    setup_handlers(dispatcher)
+    setup_handlers(application)
     
-    # Return the updater to allow graceful stop in server mode
-    return updater
\ No newline at end of file
+    # Return the application so the caller decides how to run it
+    return application
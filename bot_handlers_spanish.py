@@ -1,238 +1,420 @@
 import os
 import logging
+from typing import Optional
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
-    Updater, CommandHandler, CallbackQueryHandler, 
-    MessageHandler, Filters, CallbackContext, ConversationHandler
+    AIORateLimiter, Application, ApplicationBuilder, ChatMemberHandler, CommandHandler, CallbackQueryHandler,
+    MessageHandler, TypeHandler, filters, ContextTypes, ConversationHandler
 )
+from bot_common import (
+    MENU_PAGE_PATTERN, MENU_PAGE_SIZE, RatingTexts, chat_member_updated, edit_message, forget_edit,
+    is_admin, name_token, paginate, rating_lines, remember_menu, run_bot, stored_menu, token_name
+)
+from cache import TTLCache
+from config import cached_env
 from data_store import DataStore
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG,
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # State definitions for conversation handler
 CREATE_LIST, ADD_ITEM, SELECT_LIST, RATE_ITEM, SELECTING_ITEM_TO_RATE, ADD_COMMENT = range(6)
 DELETE_LIST, DELETE_ITEM, DELETE_RATING, CONFIRM_DELETE = range(6, 10)
 
-# Initialize the data store
-data_store = DataStore()
+# Maximum number of updates processed concurrently. DataStore methods are
+# synchronous, so they run atomically on the event loop without extra locking.
+CONCURRENT_UPDATES = 64
 
-# Commands that are restricted to admins only
-ADMIN_COMMANDS = ['/newlist', '/deletelist', '/deleteitem', '/deleterating', '/clearratings']
+# Times a request is retried after Telegram answers with RetryAfter (429)
+RATE_LIMIT_RETRIES = 3
+
+# Seconds of inactivity after which an unfinished conversation is dropped
+CONVERSATION_TIMEOUT = 300
+
+# user_data keys set while a conversation is in progress
+_CONVERSATION_KEYS = (
+    "selected_list", "rating_list", "rating_item", "temp_rating",
+    "delete_list_name", "delete_item_list", "delete_item_name",
+    "delete_rating_list", "delete_rating_item", "delete_rating_index",
+    "clear_ratings_list", "clear_ratings_item",
+)
+
+# Long replies are split into messages below Telegram's 4096-character limit;
+# only after MAX_MESSAGE_PAGES messages is the rest cut off
+MESSAGE_PAGE_SIZE = 4000
+MAX_MESSAGE_PAGES = 10
+TRUNCATED_NOTE = "\n\n... (mensaje truncado debido a su longitud)"
+
+# Texts of the /ratings overview, laid out by rating_lines
+_RATING_TEXTS = RatingTexts(
+    header="Valoraciones para elementos en '{list_name}':\n\n",
+    rated="• {item_name}\n  Promedio: {mean:.1f}/10\n  Todas las valoraciones:\n",
+    unrated="• {item_name}: Sin valorar aún\n\n",
+)
+
+# Static replies, built once at import
+_START_MSG = (
+    "¡Bienvenido al Bot de Listas y Valoraciones!\n\n"
+    "Puedes usar este bot para crear listas y valorar elementos del 0 al 10, con la opción de añadir comentarios a tus valoraciones.\n\n"
+    "Comandos:\n"
+    "/additem - Añadir un elemento a una lista\n"
+    "/lists - Ver todas las listas disponibles\n"
+    "/viewlist - Ver elementos de una lista específica\n"
+    "/rate - Valorar un elemento de una lista y añadir comentarios\n"
+    "/ratings - Ver valoraciones y comentarios de elementos en una lista\n"
+    "/help - Mostrar este mensaje de ayuda\n"
+    "/cancel - Cancelar la operación actual"
+)
+
+_HELP_MSG = (
+    "Comandos del Bot de Listas y Valoraciones:\n\n"
+    "/additem - Añadir un elemento a una lista\n"
+    "/lists - Ver todas las listas disponibles\n"
+    "/viewlist - Ver elementos de una lista específica\n"
+    "/rate - Valorar un elemento (0-10) y añadir comentarios\n"
+    "/ratings - Ver valoraciones y comentarios de elementos\n"
+    "/help - Mostrar este mensaje de ayuda\n"
+    "/cancel - Cancelar la operación actual\n\n"
+    "Consejos para valoraciones:\n"
+    "- Al valorar elementos, puedes añadir un comentario explicando tu valoración\n"
+    "- Usa /skip para omitir añadir un comentario si no quieres explicar tu valoración"
+)
+
+_ADMIN_COMMANDS_MSG = (
+    "\n\nComandos de Administrador (solo disponibles para administradores del chat):\n"
+    "/newlist - Crear una nueva lista\n"
+    "/deletelist - Eliminar una lista y todos sus elementos\n"
+    "/deleteitem - Eliminar un elemento de una lista\n"
+    "/deleterating - Eliminar una valoración específica\n"
+    "/clearratings - Borrar todas las valoraciones de un elemento"
+)
 
-def is_admin(update: Update, context: CallbackContext) -> bool:
+_START_ADMIN_MSG = _START_MSG + _ADMIN_COMMANDS_MSG
+_HELP_ADMIN_MSG = _HELP_MSG + _ADMIN_COMMANDS_MSG
+
+# Rating keyboard with buttons 0-10, four per row; the same for every item
+_RATING_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton(str(i), callback_data=f"give_rating_{i}") for i in range(row, min(row + 4, 11))]
+    for row in range(0, 11, 4)
+])
+
+# Yes/No keyboards for the confirmation dialogs; they never change
+_CONFIRM_DELETE_LIST_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Sí, eliminar esta lista", callback_data="confirm_delete_list")],
+    [InlineKeyboardButton("No, mantener esta lista", callback_data="cancel_delete")]
+])
+_CONFIRM_DELETE_ITEM_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Sí, eliminar este elemento", callback_data="confirm_delete_item")],
+    [InlineKeyboardButton("No, mantener este elemento", callback_data="cancel_delete")]
+])
+_CONFIRM_DELETE_RATING_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Sí, eliminar esta valoración", callback_data="confirm_delete_rating")],
+    [InlineKeyboardButton("No, mantener esta valoración", callback_data="cancel_delete")]
+])
+_CONFIRM_CLEAR_RATINGS_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Sí, borrar todas las valoraciones", callback_data="confirm_clear_ratings")],
+    [InlineKeyboardButton("No, mantener las valoraciones", callback_data="cancel_delete")]
+])
+
+def get_data_store(context: ContextTypes.DEFAULT_TYPE) -> DataStore:
     """
-    Check if the user is an admin in the chat.
-    In private chats, the user is always considered an admin.
+    Get the application's data store, created by setup_handlers.
     
     Args:
-        update: The update object
         context: The context object
         
     Returns:
-        bool: True if the user is an admin, False otherwise
+        DataStore: The data store kept in bot_data
     """
-    chat_id = update.effective_chat.id
-    user_id = update.effective_user.id
+    return context.bot_data["data_store"]
+
+async def _menu_expired(query, answer: bool = False) -> int:
+    """Tell the user a menu button is no longer valid and end the conversation."""
+    if answer:
+        await query.answer()
+    await edit_message(query, "Este menú ha caducado. Por favor, empieza de nuevo.")
+    return ConversationHandler.END
+
+# Caches derived from the data store, kept next to it in bot_data by
+# setup_handlers so each application has its own: the per-user list names,
+# the per-list items and the picker keyboards built from them. Every list menu
+# and rating step reads them; each write below drops the affected entries.
+CACHE_SIZE = 10_000
+CACHE_TTL = 3600.0
+_STORE_CACHES = ("lists_cache", "items_cache", "markup_cache")
+
+def get_all_lists_cached(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> tuple[str, ...]:
+    """
+    Get the names of the user's lists, reusing a recent lookup.
     
-    # If in a private chat, the user is always considered an admin
-    if update.effective_chat.type == 'private':
-        return True
+    Args:
+        context: The context object
+        user_id: Telegram user ID
         
-    try:
-        # Check if the user is an admin in the chat
-        chat_member = context.bot.get_chat_member(chat_id, user_id)
-        return chat_member.status in ['creator', 'administrator']
-    except Exception as e:
-        logger.error(f"Error checking admin status: {e}")
-        return False
+    Returns:
+        tuple[str, ...]: Names of the user's lists
+    """
+    lists_cache = context.bot_data["lists_cache"]
+    lists = lists_cache.get(user_id)
+    if lists is None:
+        lists = tuple(get_data_store(context).get_all_lists(user_id))
+        lists_cache.set(user_id, lists)
+    return lists
+
+def get_list_items_cached(context: ContextTypes.DEFAULT_TYPE, user_id: int, list_name: str) -> dict:
+    """
+    Get the items of one of the user's lists, reusing a recent lookup.
+    
+    Args:
+        context: The context object
+        user_id: Telegram user ID
+        list_name: Name of the list
+        
+    Returns:
+        dict: Item names mapped to their ratings
+    """
+    key = (user_id, list_name)
+    items_cache = context.bot_data["items_cache"]
+    items = items_cache.get(key)
+    if items is None:
+        items = get_data_store(context).get_list_items(user_id, list_name)
+        items_cache.set(key, items)
+    return items
+
+def invalidate_cached_list(context: ContextTypes.DEFAULT_TYPE, user_id: int, list_name: str, lists_changed: bool = False) -> None:
+    """
+    Drop cached data made stale by a write to a list.
+    
+    Args:
+        context: The context object
+        user_id: Telegram user ID
+        list_name: Name of the list that changed
+        lists_changed: Whether the list itself was created or deleted
+    """
+    context.bot_data["items_cache"].pop((user_id, list_name))
+    if lists_changed:
+        context.bot_data["lists_cache"].pop(user_id)
+
+def _name_markup(update: Update, context: ContextTypes.DEFAULT_TYPE, prefix: str, names, page: int = 0) -> InlineKeyboardMarkup:
+    """
+    Get a keyboard with one button per list or item name for one page of a menu.
+    Keyboards are cached per (chat_id, user_id, callback prefix, page) and
+    rebuilt only when the names or their callback tokens differ from the
+    last call. Menus with more than one page must be passed to remember_menu
+    once sent, so turn_menu_page can show the other pages.
+    
+    Args:
+        update: The update object
+        context: The context object
+        prefix: Callback data prefix for the buttons
+        names: List or item names, in display order
+        page: Zero-based page to show
         
+    Returns:
+        InlineKeyboardMarkup: The keyboard
+    """
+    names = tuple(names)
+    start = page * MENU_PAGE_SIZE
+    # Looking the tokens up also keeps them from expiring while the menu is
+    # shown; only the current page needs them, so a menu never outgrows the table
+    tokens = tuple(name_token(context, name) for name in names[start:start + MENU_PAGE_SIZE])
+    key = (update.effective_chat.id, update.effective_user.id, prefix, page)
+    markup_cache = context.bot_data["markup_cache"]
+    cached = markup_cache.get(key)
+    if cached is not None and cached[0] == names and cached[1] == tokens:
+        return cached[2]
+    
+    keyboard = [
+        [InlineKeyboardButton(name, callback_data=f"{prefix}{token}")]
+        for name, token in zip(names[start:], tokens)
+    ]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("« Anterior", callback_data=f"{prefix}page_{page - 1}"))
+    if start + MENU_PAGE_SIZE < len(names):
+        nav.append(InlineKeyboardButton("Siguiente »", callback_data=f"{prefix}page_{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    markup_cache.set(key, (names, tokens, reply_markup))
+    return reply_markup
+
+async def turn_menu_page(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[int]:
+    """Show another page of a list or item menu, staying in the same conversation state."""
+    query = update.callback_query
+    
+    prefix, _, page = query.data.rpartition("page_")
+    message = query.message
+    menu = stored_menu(context, message, prefix)
+    if menu is None:
+        return await _menu_expired(query, answer=True)
+    
+    user_id, names = menu
+    if user_id != query.from_user.id:
+        # Someone else's menu in a group; leave it as it is
+        await query.answer("Este menú pertenece a otro usuario.")
+        return None
+    
+    await query.answer()
+    await query.edit_message_reply_markup(reply_markup=_name_markup(update, context, prefix, names, int(page)))
+    # The keyboard changed behind edit_message's back
+    forget_edit(message)
+    return None
+
+# Commands that are restricted to admins only
+ADMIN_COMMANDS = ['/newlist', '/deletelist', '/deleteitem', '/deleterating', '/clearratings']
+
 def admin_required(func):
     """
     Decorator to restrict handler access to admins only.
     """
-    def wrapped(update, context, *args, **kwargs):
+    async def wrapped(update, context, *args, **kwargs):
         # Check if user is admin
-        if not is_admin(update, context):
+        if not await is_admin(update, context):
             command = update.message.text.split()[0] if update.message and update.message.text else ""
             if command in ADMIN_COMMANDS:
-                update.message.reply_text("Este comando solo está disponible para administradores del chat.")
+                await update.message.reply_text("Este comando solo está disponible para administradores del chat.")
                 return ConversationHandler.END
         
         # Call the original handler
-        return func(update, context, *args, **kwargs)
+        return await func(update, context, *args, **kwargs)
     return wrapped
 
-# Command handlers
-def start(update: Update, context: CallbackContext) -> None:
-    """Send a welcome message when the command /start is issued."""
-    is_user_admin = is_admin(update, context)
-    
-    base_message = (
-        "¡Bienvenido al Bot de Listas y Valoraciones!\n\n"
-        "Puedes usar este bot para crear listas y valorar elementos del 0 al 10, con la opción de añadir comentarios a tus valoraciones.\n\n"
-        "Comandos:\n"
-        "/additem - Añadir un elemento a una lista\n"
-        "/lists - Ver todas las listas disponibles\n"
-        "/viewlist - Ver elementos de una lista específica\n"
-        "/rate - Valorar un elemento de una lista y añadir comentarios\n"
-        "/ratings - Ver valoraciones y comentarios de elementos en una lista\n"
-        "/help - Mostrar este mensaje de ayuda\n"
-        "/cancel - Cancelar la operación actual"
-    )
+def make_list_picker(prefix: str, prompt: str, next_state: int, doc: str):
+    """
+    Create a conversation entry point that asks the user to pick one of their lists.
     
-    admin_commands = (
-        "\n\nComandos de Administrador (solo disponibles para administradores del chat):\n"
-        "/newlist - Crear una nueva lista\n"
-        "/deletelist - Eliminar una lista y todos sus elementos\n"
-        "/deleteitem - Eliminar un elemento de una lista\n"
-        "/deleterating - Eliminar una valoración específica\n"
-        "/clearratings - Borrar todas las valoraciones de un elemento"
-    )
+    Args:
+        prefix: Callback data prefix for the list buttons
+        prompt: Message shown above the list buttons
+        next_state: Conversation state to move to once the menu is shown
+        doc: Docstring for the generated handler
+        
+    Returns:
+        The async handler function
+    """
+    async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+        user_id = update.effective_user.id
+        lists = get_all_lists_cached(context, user_id)
+        
+        if not lists:
+            await update.message.reply_text(
+                "Aún no tienes listas. Crea una primero con /newlist"
+            )
+            return ConversationHandler.END
+        
+        reply_markup = _name_markup(update, context, prefix, lists)
+        message = await update.message.reply_text(prompt, reply_markup=reply_markup)
+        remember_menu(context, message, user_id, prefix, lists)
+        
+        return next_state
     
+    handler.__doc__ = doc
+    return handler
+
+# Command handlers
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send a welcome message when the command /start is issued."""
     # Show admin commands only if the user is an admin
-    if is_user_admin:
-        update.message.reply_text(base_message + admin_commands)
+    if await is_admin(update, context):
+        await update.message.reply_text(_START_ADMIN_MSG)
     else:
-        update.message.reply_text(base_message)
+        await update.message.reply_text(_START_MSG)
 
-def help_command(update: Update, context: CallbackContext) -> None:
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a help message when the command /help is issued."""
-    is_user_admin = is_admin(update, context)
-    
-    base_commands = (
-        "Comandos del Bot de Listas y Valoraciones:\n\n"
-        "/additem - Añadir un elemento a una lista\n"
-        "/lists - Ver todas las listas disponibles\n"
-        "/viewlist - Ver elementos de una lista específica\n"
-        "/rate - Valorar un elemento (0-10) y añadir comentarios\n"
-        "/ratings - Ver valoraciones y comentarios de elementos\n"
-        "/help - Mostrar este mensaje de ayuda\n"
-        "/cancel - Cancelar la operación actual\n\n"
-        "Consejos para valoraciones:\n"
-        "- Al valorar elementos, puedes añadir un comentario explicando tu valoración\n"
-        "- Usa /skip para omitir añadir un comentario si no quieres explicar tu valoración"
-    )
-    
-    admin_commands = (
-        "\n\nComandos de Administrador (solo disponibles para administradores del chat):\n"
-        "/newlist - Crear una nueva lista\n"
-        "/deletelist - Eliminar una lista y todos sus elementos\n"
-        "/deleteitem - Eliminar un elemento de una lista\n"
-        "/deleterating - Eliminar una valoración específica\n"
-        "/clearratings - Borrar todas las valoraciones de un elemento"
-    )
-    
     # Show admin commands only if the user is an admin
-    if is_user_admin:
-        update.message.reply_text(base_commands + admin_commands)
+    if await is_admin(update, context):
+        await update.message.reply_text(_HELP_ADMIN_MSG)
     else:
-        update.message.reply_text(base_commands)
+        await update.message.reply_text(_HELP_MSG)
 
 # List creation handlers
 @admin_required
-def new_list(update: Update, context: CallbackContext) -> int:
+async def new_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the process of creating a new list."""
-    update.message.reply_text(
+    await update.message.reply_text(
         "¡Vamos a crear una nueva lista! ¿Cómo quieres llamar a tu lista?"
     )
     return CREATE_LIST
 
-def create_list(update: Update, context: CallbackContext) -> int:
+async def create_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Create a new list with the provided name."""
     list_name = update.message.text
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
     
     # Check if list name already exists for this user
-    if data_store.list_exists(user_id, list_name):
-        update.message.reply_text(
+    if get_data_store(context).list_exists(user_id, list_name):
+        await update.message.reply_text(
             f"Ya tienes una lista llamada '{list_name}'. Por favor, elige un nombre diferente."
         )
         return CREATE_LIST
     
     # Create the new list
-    data_store.create_list(user_id, list_name)
+    get_data_store(context).create_list(user_id, list_name)
+    invalidate_cached_list(context, user_id, list_name, lists_changed=True)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"¡Genial! He creado una nueva lista llamada '{list_name}'.\n"
         f"Puedes añadir elementos con /additem"
     )
     return ConversationHandler.END
 
 # List viewing handlers
-def show_lists(update: Update, context: CallbackContext) -> None:
+async def show_lists(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show all lists created by the user."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
+    user_id = update.effective_user.id
+    lists = get_all_lists_cached(context, user_id)
     
     if not lists:
-        update.message.reply_text(
+        await update.message.reply_text(
             "Aún no has creado ninguna lista. ¡Usa /newlist para crear una!"
         )
         return
     
-    message = "Tus listas:\n\n"
-    for i, list_name in enumerate(lists, 1):
-        message += f"{i}. {list_name}\n"
+    message = "Tus listas:\n\n" + "".join(f"{i}. {list_name}\n" for i, list_name in enumerate(lists, 1))
     
-    update.message.reply_text(message)
+    await update.message.reply_text(message)
 
 # Item addition handlers
-def add_item_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of adding an item to a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"add_to_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Elige una lista para añadir un elemento:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+add_item_start = make_list_picker("add_to_", "Elige una lista para añadir un elemento:", SELECT_LIST, "Start the process of adding an item to a list.")
 
-def select_list_for_item(update: Update, context: CallbackContext) -> int:
+async def select_list_for_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for adding an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    list_name = query.data.replace("add_to_", "")
+    list_name = token_name(context, query.data.removeprefix("add_to_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["selected_list"] = list_name
     
-    query.edit_message_text(f"¿Qué elemento quieres añadir a '{list_name}'?")
+    await edit_message(query, f"¿Qué elemento quieres añadir a '{list_name}'?")
     
     return ADD_ITEM
 
-def add_item_to_list(update: Update, context: CallbackContext) -> int:
+async def add_item_to_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Add an item to the selected list."""
-    user_id = str(update.effective_user.id)
+    user_id = update.effective_user.id
     list_name = context.user_data.get("selected_list")
     item_name = update.message.text
     
     if not list_name:
-        update.message.reply_text("Algo salió mal. Por favor, inténtalo de nuevo con /additem")
+        await update.message.reply_text("Algo salió mal. Por favor, inténtalo de nuevo con /additem")
         return ConversationHandler.END
     
     # Check if item already exists in this list
-    if data_store.item_exists(user_id, list_name, item_name):
-        update.message.reply_text(
+    if get_data_store(context).item_exists(user_id, list_name, item_name):
+        await update.message.reply_text(
             f"'{item_name}' ya existe en '{list_name}'. Por favor, añade un elemento diferente."
         )
         return ADD_ITEM
     
     # Add the item to the list
-    data_store.add_item(user_id, list_name, item_name)
+    get_data_store(context).add_item(user_id, list_name, item_name)
+    invalidate_cached_list(context, user_id, list_name)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"¡Añadido '{item_name}' a '{list_name}'!\n"
         f"Puedes valorarlo con /rate"
     )
@@ -240,146 +422,104 @@ def add_item_to_list(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 # View list items handlers
-def view_list_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of viewing items in a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"view_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Elige una lista para ver:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+view_list_start = make_list_picker("view_", "Elige una lista para ver:", SELECT_LIST, "Start the process of viewing items in a list.")
 
-def view_list_items(update: Update, context: CallbackContext) -> int:
+async def view_list_items(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show the items in the selected list."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("view_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("view_"))
+    if list_name is None:
+        return await _menu_expired(query)
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_data_store(context).get_items_with_averages(user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"La lista '{list_name}' está vacía. Añade elementos con /additem"
         )
     else:
-        message = f"Elementos en '{list_name}':\n\n"
-        for i, item_data in enumerate(items.items(), 1):
-            item_name, ratings = item_data
-            
-            # Use the get_average_rating helper method
-            avg_rating = data_store.get_average_rating(user_id, list_name, item_name)
-            avg_rating_text = f"{avg_rating:.1f}" if ratings else "Sin valorar"
+        parts = [f"Elementos en '{list_name}':\n\n"]
+        for i, (item_name, avg_rating, count) in enumerate(items, 1):
+            avg_rating_text = f"{avg_rating:.1f}" if count else "Sin valorar"
             
-            message += f"{i}. {item_name} - Valoración media: {avg_rating_text}\n"
+            parts.append(f"{i}. {item_name} - Valoración media: {avg_rating_text}\n")
         
-        query.edit_message_text(message)
+        await edit_message(query, "".join(parts))
     
     return ConversationHandler.END
 
 # Rating handlers
-def rate_item_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of rating an item."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"rate_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Elige una lista que contenga el elemento que quieres valorar:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+rate_item_start = make_list_picker("rate_list_", "Elige una lista que contenga el elemento que quieres valorar:", SELECT_LIST, "Start the process of rating an item.")
 
-def select_list_for_rating(update: Update, context: CallbackContext) -> int:
+async def select_list_for_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for rating an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("rate_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("rate_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["rating_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(context, user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"La lista '{list_name}' está vacía. Añade elementos con /additem"
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"rate_item_{item_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"Elige un elemento de '{list_name}' para valorar:", reply_markup=reply_markup)
+    reply_markup = _name_markup(update, context, "rate_item_", items)
+    await edit_message(query, f"Elige un elemento de '{list_name}' para valorar:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "rate_item_", items)
     
     return SELECTING_ITEM_TO_RATE
 
-def select_item_for_rating(update: Update, context: CallbackContext) -> int:
+async def select_item_for_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the item selection for rating."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    item_name = query.data.replace("rate_item_", "")
+    item_name = token_name(context, query.data.removeprefix("rate_item_"))
+    if item_name is None:
+        return await _menu_expired(query)
     context.user_data["rating_item"] = item_name
     
-    # Create rating keyboard with buttons 0-10
-    keyboard = []
-    row = []
-    for i in range(11):  # 0 to 10
-        row.append(InlineKeyboardButton(str(i), callback_data=f"give_rating_{i}"))
-        if len(row) == 4 or i == 10:  # 4 buttons per row, or last button
-            keyboard.append(row.copy())
-            row = []
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _RATING_KEYBOARD
+    await edit_message(
+        query,
         f"Valora '{item_name}' en una escala del 0 al 10:",
         reply_markup=reply_markup
     )
     
     return RATE_ITEM
 
-def apply_rating(update: Update, context: CallbackContext) -> int:
+async def apply_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Store the rating and ask for a comment."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
+    user_id = query.from_user.id
     list_name = context.user_data.get("rating_list")
     item_name = context.user_data.get("rating_item")
-    rating = int(query.data.replace("give_rating_", ""))
+    rating = int(query.data.removeprefix("give_rating_"))
     
-    if not all([list_name, item_name]):
-        query.edit_message_text("Algo salió mal. Por favor, inténtalo de nuevo con /rate")
+    if list_name is None or item_name is None:
+        await edit_message(query, "Algo salió mal. Por favor, inténtalo de nuevo con /rate")
         return ConversationHandler.END
     
     # Store the rating in user_data temporarily
     context.user_data["temp_rating"] = rating
     
     # Ask for a comment
-    query.edit_message_text(
+    await edit_message(
+        query,
         f"¡Has dado a '{item_name}' un {rating}/10!\n\n"
         f"¿Te gustaría añadir un comentario sobre por qué has dado esta valoración?\n"
         f"Escribe tu comentario o envía /skip para continuar sin un comentario."
@@ -387,149 +527,96 @@ def apply_rating(update: Update, context: CallbackContext) -> int:
     
     return ADD_COMMENT
     
-def add_rating_comment(update: Update, context: CallbackContext) -> int:
+async def add_rating_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Apply the rating with the user's comment."""
     comment = update.message.text
-    user_id = str(update.effective_user.id)
-    list_name = context.user_data.get("rating_list")
-    item_name = context.user_data.get("rating_item")
-    rating = context.user_data.get("temp_rating")
+    user_id = update.effective_user.id
+    list_name = context.user_data.pop("rating_list", None)
+    item_name = context.user_data.pop("rating_item", None)
+    rating = context.user_data.pop("temp_rating", None)
     
-    if not all([list_name, item_name, rating is not None]):
-        update.message.reply_text("Algo salió mal. Por favor, inténtalo de nuevo con /rate")
+    if list_name is None or item_name is None or rating is None:
+        await update.message.reply_text("Algo salió mal. Por favor, inténtalo de nuevo con /rate")
         return ConversationHandler.END
     
     # Add the rating with comment to the item
-    data_store.add_rating(user_id, list_name, item_name, rating, comment)
+    get_data_store(context).add_rating(user_id, list_name, item_name, rating, comment)
+    invalidate_cached_list(context, user_id, list_name)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"Has valorado '{item_name}' con un {rating}/10 y el comentario:\n\n"
         f"\"{comment}\""
     )
     
     return ConversationHandler.END
     
-def skip_comment(update: Update, context: CallbackContext) -> int:
+async def skip_comment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Skip adding a comment and just save the rating."""
-    user_id = str(update.effective_user.id)
-    list_name = context.user_data.get("rating_list")
-    item_name = context.user_data.get("rating_item")
-    rating = context.user_data.get("temp_rating")
+    user_id = update.effective_user.id
+    list_name = context.user_data.pop("rating_list", None)
+    item_name = context.user_data.pop("rating_item", None)
+    rating = context.user_data.pop("temp_rating", None)
     
-    if not all([list_name, item_name, rating is not None]):
-        update.message.reply_text("Algo salió mal. Por favor, inténtalo de nuevo con /rate")
+    if list_name is None or item_name is None or rating is None:
+        await update.message.reply_text("Algo salió mal. Por favor, inténtalo de nuevo con /rate")
         return ConversationHandler.END
     
     # Add the rating without comment
-    data_store.add_rating(user_id, list_name, item_name, rating)
+    get_data_store(context).add_rating(user_id, list_name, item_name, rating)
+    invalidate_cached_list(context, user_id, list_name)
     
-    update.message.reply_text(
+    await update.message.reply_text(
         f"Has valorado '{item_name}' con un {rating}/10 sin comentario."
     )
     
     return ConversationHandler.END
 
 # View ratings handlers
-def view_ratings_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of viewing ratings for items in a list."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"ratings_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Elige una lista para ver las valoraciones:", reply_markup=reply_markup)
-    
-    return SELECT_LIST
+view_ratings_start = make_list_picker("ratings_", "Elige una lista para ver las valoraciones:", SELECT_LIST, "Start the process of viewing ratings for items in a list.")
 
-def view_list_ratings(update: Update, context: CallbackContext) -> int:
+async def view_list_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Show the ratings for items in the selected list."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("ratings_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("ratings_"))
+    if list_name is None:
+        return await _menu_expired(query)
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(context, user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"La lista '{list_name}' está vacía. Añade elementos con /additem"
         )
     else:
-        message = f"Valoraciones para elementos en '{list_name}':\n\n"
-        for item_name, ratings in items.items():
-            if ratings:
-                # Use the get_average_rating helper method
-                avg_rating = data_store.get_average_rating(user_id, list_name, item_name)
-                
-                message += f"• {item_name}\n"
-                message += f"  Promedio: {avg_rating:.1f}/10\n"
-                message += f"  Todas las valoraciones:\n"
-                
-                # Show each rating with its comment if available
-                for i, (rating, comment) in enumerate(ratings, 1):
-                    message += f"    {i}. {rating}/10"
-                    if comment:
-                        message += f" - \"{comment}\""
-                    message += "\n"
-                message += "\n"
-            else:
-                message += f"• {item_name}: Sin valorar aún\n\n"
+        messages = paginate(rating_lines(list_name, items, _RATING_TEXTS), MESSAGE_PAGE_SIZE, MAX_MESSAGE_PAGES, TRUNCATED_NOTE)
         
-        # If message is too long, split it
-        if len(message) > 4000:  # Telegram message limit is around 4096 characters
-            message = message[:3950] + "\n\n... (mensaje truncado debido a su longitud)"
-            
-        query.edit_message_text(message)
+        # The first page replaces the menu; any further pages follow in order
+        await edit_message(query, messages[0])
+        for message in messages[1:]:
+            await context.bot.send_message(query.message.chat_id, message)
     
     return ConversationHandler.END
 
 # Delete list handlers
-@admin_required
-def delete_list_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of deleting a list. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"delete_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("⚠️ Elige una lista para ELIMINAR:", reply_markup=reply_markup)
-    
-    return DELETE_LIST
+delete_list_start = admin_required(make_list_picker("delete_list_", "⚠️ Elige una lista para ELIMINAR:", DELETE_LIST, "Start the process of deleting a list. Admin only."))
 
-def confirm_delete_list(update: Update, context: CallbackContext) -> int:
+async def confirm_delete_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ask for confirmation before deleting a list."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    list_name = query.data.replace("delete_list_", "")
+    list_name = token_name(context, query.data.removeprefix("delete_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["delete_list_name"] = list_name
     
-    keyboard = [
-        [InlineKeyboardButton("Sí, eliminar esta lista", callback_data="confirm_delete_list")],
-        [InlineKeyboardButton("No, mantener esta lista", callback_data="cancel_delete")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _CONFIRM_DELETE_LIST_KEYBOARD
+    await edit_message(
+        query,
         f"⚠️ ¿Estás seguro de que quieres eliminar la lista '{list_name}' y todos sus elementos y valoraciones?\n\n"
         "¡Esta acción no se puede deshacer!",
         reply_markup=reply_markup
@@ -537,91 +624,71 @@ def confirm_delete_list(update: Update, context: CallbackContext) -> int:
     
     return CONFIRM_DELETE
 
-def execute_delete_list(update: Update, context: CallbackContext) -> int:
+async def execute_delete_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Delete the selected list after confirmation."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("delete_list_name")
+    user_id = query.from_user.id
+    list_name = context.user_data.pop("delete_list_name", None)
     
-    if not list_name:
-        query.edit_message_text("Algo salió mal. Por favor, inténtalo de nuevo con /deletelist")
+    if list_name is None:
+        await edit_message(query, "Algo salió mal. Por favor, inténtalo de nuevo con /deletelist")
         return ConversationHandler.END
     
     # Delete the list
-    success = data_store.delete_list(user_id, list_name)
+    success = get_data_store(context).delete_list(user_id, list_name)
+    invalidate_cached_list(context, user_id, list_name, lists_changed=True)
     
     if success:
-        query.edit_message_text(f"✅ La lista '{list_name}' ha sido eliminada junto con todos sus elementos y valoraciones.")
+        await edit_message(query, f"✅ La lista '{list_name}' ha sido eliminada junto con todos sus elementos y valoraciones.")
     else:
-        query.edit_message_text(f"❌ No se pudo eliminar la lista '{list_name}'. Por favor, inténtalo de nuevo.")
+        await edit_message(query, f"❌ No se pudo eliminar la lista '{list_name}'. Por favor, inténtalo de nuevo.")
     
     return ConversationHandler.END
 
 # Delete item handlers
-@admin_required
-def delete_item_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of deleting an item. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"delete_item_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Selecciona una lista que contenga el elemento que quieres eliminar:", reply_markup=reply_markup)
-    
-    return DELETE_ITEM
+delete_item_start = admin_required(make_list_picker("delete_item_list_", "Selecciona una lista que contenga el elemento que quieres eliminar:", DELETE_ITEM, "Start the process of deleting an item. Admin only."))
 
-def select_list_for_delete_item(update: Update, context: CallbackContext) -> int:
+async def select_list_for_delete_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for deleting an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("delete_item_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("delete_item_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["delete_item_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(context, user_id, list_name)
     
     if not items:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"La lista '{list_name}' está vacía. No hay elementos para eliminar."
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"delete_item_{item_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"⚠️ Selecciona un elemento de '{list_name}' para ELIMINAR:", reply_markup=reply_markup)
+    reply_markup = _name_markup(update, context, "delete_item_", items)
+    await edit_message(query, f"⚠️ Selecciona un elemento de '{list_name}' para ELIMINAR:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "delete_item_", items)
     
     return CONFIRM_DELETE
 
-def confirm_delete_item(update: Update, context: CallbackContext) -> int:
+async def confirm_delete_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ask for confirmation before deleting an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    item_name = query.data.replace("delete_item_", "")
+    item_name = token_name(context, query.data.removeprefix("delete_item_"))
+    if item_name is None:
+        return await _menu_expired(query)
     context.user_data["delete_item_name"] = item_name
     
-    keyboard = [
-        [InlineKeyboardButton("Sí, eliminar este elemento", callback_data="confirm_delete_item")],
-        [InlineKeyboardButton("No, mantener este elemento", callback_data="cancel_delete")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _CONFIRM_DELETE_ITEM_KEYBOARD
+    await edit_message(
+        query,
         f"⚠️ ¿Estás seguro de que quieres eliminar '{item_name}' y todas sus valoraciones?\n\n"
         "¡Esta acción no se puede deshacer!",
         reply_markup=reply_markup
@@ -629,128 +696,109 @@ def confirm_delete_item(update: Update, context: CallbackContext) -> int:
     
     return CONFIRM_DELETE
 
-def execute_delete_item(update: Update, context: CallbackContext) -> int:
+async def execute_delete_item(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Delete the selected item after confirmation."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("delete_item_list")
-    item_name = context.user_data.get("delete_item_name")
+    user_id = query.from_user.id
+    list_name = context.user_data.pop("delete_item_list", None)
+    item_name = context.user_data.pop("delete_item_name", None)
     
-    if not all([list_name, item_name]):
-        query.edit_message_text("Algo salió mal. Por favor, inténtalo de nuevo con /deleteitem")
+    if list_name is None or item_name is None:
+        await edit_message(query, "Algo salió mal. Por favor, inténtalo de nuevo con /deleteitem")
         return ConversationHandler.END
     
     # Delete the item
-    success = data_store.delete_item(user_id, list_name, item_name)
+    success = get_data_store(context).delete_item(user_id, list_name, item_name)
+    invalidate_cached_list(context, user_id, list_name)
     
     if success:
-        query.edit_message_text(f"✅ '{item_name}' ha sido eliminado de '{list_name}' junto con todas sus valoraciones.")
+        await edit_message(query, f"✅ '{item_name}' ha sido eliminado de '{list_name}' junto con todas sus valoraciones.")
     else:
-        query.edit_message_text(f"❌ No se pudo eliminar '{item_name}'. Por favor, inténtalo de nuevo.")
+        await edit_message(query, f"❌ No se pudo eliminar '{item_name}'. Por favor, inténtalo de nuevo.")
     
     return ConversationHandler.END
 
 # Delete rating handlers
-@admin_required
-def delete_rating_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of deleting a rating. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"delete_rating_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Selecciona una lista que contenga la valoración que quieres eliminar:", reply_markup=reply_markup)
-    
-    return DELETE_RATING
+delete_rating_start = admin_required(make_list_picker("delete_rating_list_", "Selecciona una lista que contenga la valoración que quieres eliminar:", DELETE_RATING, "Start the process of deleting a rating. Admin only."))
 
-def select_list_for_delete_rating(update: Update, context: CallbackContext) -> int:
+async def select_list_for_delete_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for deleting a rating."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("delete_rating_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("delete_rating_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["delete_rating_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(context, user_id, list_name)
     
-    # Filter only items with ratings
-    items_with_ratings = {name: ratings for name, ratings in items.items() if ratings}
+    # Names of the items that have ratings; the ratings themselves are not needed here
+    rated_items = [name for name, ratings in items.items() if ratings]
     
-    if not items_with_ratings:
-        query.edit_message_text(
+    if not rated_items:
+        await edit_message(
+            query,
             f"No hay valoraciones para eliminar en la lista '{list_name}'."
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items_with_ratings:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"delete_rating_item_{item_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"Selecciona un elemento de '{list_name}' para ver sus valoraciones:", reply_markup=reply_markup)
+    reply_markup = _name_markup(update, context, "delete_rating_item_", rated_items)
+    await edit_message(query, f"Selecciona un elemento de '{list_name}' para ver sus valoraciones:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "delete_rating_item_", rated_items)
     
     return CONFIRM_DELETE
 
-def select_item_for_delete_rating(update: Update, context: CallbackContext) -> int:
+async def select_item_for_delete_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the item selection for deleting a rating."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
+    user_id = query.from_user.id
     list_name = context.user_data.get("delete_rating_list")
-    item_name = query.data.replace("delete_rating_item_", "")
+    item_name = token_name(context, query.data.removeprefix("delete_rating_item_"))
+    if item_name is None:
+        return await _menu_expired(query)
     context.user_data["delete_rating_item"] = item_name
     
-    ratings = data_store.get_item_ratings(user_id, list_name, item_name)
+    ratings = get_data_store(context).get_item_ratings(user_id, list_name, item_name)
     
     if not ratings:
-        query.edit_message_text(
+        await edit_message(
+            query,
             f"No hay valoraciones para '{item_name}' en la lista '{list_name}'."
         )
         return ConversationHandler.END
     
-    message = f"Valoraciones para '{item_name}':\n\n"
+    parts = [f"Valoraciones para '{item_name}':\n\n"]
     keyboard = []
     
     for i, (rating, comment) in enumerate(ratings, 0):  # Start from 0 for index
         comment_text = f" - \"{comment}\"" if comment else ""
-        message += f"{i+1}. {rating}/10{comment_text}\n"
+        parts.append(f"{i+1}. {rating}/10{comment_text}\n")
         keyboard.append([InlineKeyboardButton(f"Eliminar valoración {i+1}", callback_data=f"delete_rating_{i}")])
     
-    message += "\nSelecciona una valoración para eliminar:"
+    parts.append("\nSelecciona una valoración para eliminar:")
     
     reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(message, reply_markup=reply_markup)
+    await edit_message(query, "".join(parts), reply_markup=reply_markup)
     
     return CONFIRM_DELETE
 
-def confirm_delete_rating(update: Update, context: CallbackContext) -> int:
+async def confirm_delete_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ask for confirmation before deleting a rating."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    rating_index = int(query.data.replace("delete_rating_", ""))
+    rating_index = int(query.data.removeprefix("delete_rating_"))
     context.user_data["delete_rating_index"] = rating_index
     
-    keyboard = [
-        [InlineKeyboardButton("Sí, eliminar esta valoración", callback_data="confirm_delete_rating")],
-        [InlineKeyboardButton("No, mantener esta valoración", callback_data="cancel_delete")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _CONFIRM_DELETE_RATING_KEYBOARD
+    await edit_message(
+        query,
         f"⚠️ ¿Estás seguro de que quieres eliminar la valoración #{rating_index + 1}?\n\n"
         "¡Esta acción no se puede deshacer!",
         reply_markup=reply_markup
@@ -758,96 +806,76 @@ def confirm_delete_rating(update: Update, context: CallbackContext) -> int:
     
     return CONFIRM_DELETE
 
-def execute_delete_rating(update: Update, context: CallbackContext) -> int:
+async def execute_delete_rating(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Delete the selected rating after confirmation."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("delete_rating_list")
-    item_name = context.user_data.get("delete_rating_item")
-    rating_index = context.user_data.get("delete_rating_index")
+    user_id = query.from_user.id
+    list_name = context.user_data.pop("delete_rating_list", None)
+    item_name = context.user_data.pop("delete_rating_item", None)
+    rating_index = context.user_data.pop("delete_rating_index", None)
     
-    if not all([list_name, item_name, rating_index is not None]):
-        query.edit_message_text("Algo salió mal. Por favor, inténtalo de nuevo con /deleterating")
+    if list_name is None or item_name is None or rating_index is None:
+        await edit_message(query, "Algo salió mal. Por favor, inténtalo de nuevo con /deleterating")
         return ConversationHandler.END
     
     # Delete the rating
-    success = data_store.delete_rating(user_id, list_name, item_name, rating_index)
+    success = get_data_store(context).delete_rating(user_id, list_name, item_name, rating_index)
+    invalidate_cached_list(context, user_id, list_name)
     
     if success:
-        query.edit_message_text(f"✅ La valoración #{rating_index + 1} para '{item_name}' ha sido eliminada.")
+        await edit_message(query, f"✅ La valoración #{rating_index + 1} para '{item_name}' ha sido eliminada.")
     else:
-        query.edit_message_text(f"❌ No se pudo eliminar la valoración. Por favor, inténtalo de nuevo.")
+        await edit_message(query, f"❌ No se pudo eliminar la valoración. Por favor, inténtalo de nuevo.")
     
     return ConversationHandler.END
 
 # Clear ratings handlers
-@admin_required
-def clear_ratings_start(update: Update, context: CallbackContext) -> int:
-    """Start the process of clearing all ratings for an item. Admin only."""
-    user_id = str(update.effective_user.id)
-    lists = data_store.get_all_lists(user_id)
-    
-    if not lists:
-        update.message.reply_text(
-            "Aún no tienes listas. Crea una primero con /newlist"
-        )
-        return ConversationHandler.END
-    
-    keyboard = []
-    for list_name in lists:
-        keyboard.append([InlineKeyboardButton(list_name, callback_data=f"clear_ratings_list_{list_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text("Selecciona una lista que contenga el elemento cuyas valoraciones quieres borrar:", reply_markup=reply_markup)
-    
-    return DELETE_RATING
+clear_ratings_start = admin_required(make_list_picker("clear_ratings_list_", "Selecciona una lista que contenga el elemento cuyas valoraciones quieres borrar:", DELETE_RATING, "Start the process of clearing all ratings for an item. Admin only."))
 
-def select_list_for_clear_ratings(update: Update, context: CallbackContext) -> int:
+async def select_list_for_clear_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle the list selection for clearing ratings."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = query.data.replace("clear_ratings_list_", "")
+    user_id = query.from_user.id
+    list_name = token_name(context, query.data.removeprefix("clear_ratings_list_"))
+    if list_name is None:
+        return await _menu_expired(query)
     context.user_data["clear_ratings_list"] = list_name
     
-    items = data_store.get_list_items(user_id, list_name)
+    items = get_list_items_cached(context, user_id, list_name)
     
-    # Filter only items with ratings
-    items_with_ratings = {name: ratings for name, ratings in items.items() if ratings}
+    # Names of the items that have ratings; the ratings themselves are not needed here
+    rated_items = [name for name, ratings in items.items() if ratings]
     
-    if not items_with_ratings:
-        query.edit_message_text(
+    if not rated_items:
+        await edit_message(
+            query,
             f"No hay valoraciones para borrar en la lista '{list_name}'."
         )
         return ConversationHandler.END
     
-    keyboard = []
-    for item_name in items_with_ratings:
-        keyboard.append([InlineKeyboardButton(item_name, callback_data=f"clear_ratings_item_{item_name}")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(f"⚠️ Selecciona un elemento de '{list_name}' cuyas valoraciones quieres BORRAR:", reply_markup=reply_markup)
+    reply_markup = _name_markup(update, context, "clear_ratings_item_", rated_items)
+    await edit_message(query, f"⚠️ Selecciona un elemento de '{list_name}' cuyas valoraciones quieres BORRAR:", reply_markup=reply_markup)
+    remember_menu(context, query.message, user_id, "clear_ratings_item_", rated_items)
     
     return CONFIRM_DELETE
 
-def confirm_clear_ratings(update: Update, context: CallbackContext) -> int:
+async def confirm_clear_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Ask for confirmation before clearing all ratings for an item."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    item_name = query.data.replace("clear_ratings_item_", "")
+    item_name = token_name(context, query.data.removeprefix("clear_ratings_item_"))
+    if item_name is None:
+        return await _menu_expired(query)
     context.user_data["clear_ratings_item"] = item_name
     
-    keyboard = [
-        [InlineKeyboardButton("Sí, borrar todas las valoraciones", callback_data="confirm_clear_ratings")],
-        [InlineKeyboardButton("No, mantener las valoraciones", callback_data="cancel_delete")]
-    ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    query.edit_message_text(
+    reply_markup = _CONFIRM_CLEAR_RATINGS_KEYBOARD
+    await edit_message(
+        query,
         f"⚠️ ¿Estás seguro de que quieres borrar TODAS las valoraciones para '{item_name}'?\n\n"
         "¡Esta acción no se puede deshacer!",
         reply_markup=reply_markup
@@ -855,177 +883,181 @@ def confirm_clear_ratings(update: Update, context: CallbackContext) -> int:
     
     return CONFIRM_DELETE
 
-def execute_clear_ratings(update: Update, context: CallbackContext) -> int:
+async def execute_clear_ratings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Clear all ratings for the selected item after confirmation."""
     query = update.callback_query
-    query.answer()
+    await query.answer()
     
-    user_id = str(query.from_user.id)
-    list_name = context.user_data.get("clear_ratings_list")
-    item_name = context.user_data.get("clear_ratings_item")
+    user_id = query.from_user.id
+    list_name = context.user_data.pop("clear_ratings_list", None)
+    item_name = context.user_data.pop("clear_ratings_item", None)
     
-    if not all([list_name, item_name]):
-        query.edit_message_text("Algo salió mal. Por favor, inténtalo de nuevo con /clearratings")
+    if list_name is None or item_name is None:
+        await edit_message(query, "Algo salió mal. Por favor, inténtalo de nuevo con /clearratings")
         return ConversationHandler.END
     
     # Clear all ratings for the item
-    success = data_store.clear_ratings(user_id, list_name, item_name)
+    success = get_data_store(context).clear_ratings(user_id, list_name, item_name)
+    invalidate_cached_list(context, user_id, list_name)
     
     if success:
-        query.edit_message_text(f"✅ Todas las valoraciones para '{item_name}' han sido borradas.")
+        await edit_message(query, f"✅ Todas las valoraciones para '{item_name}' han sido borradas.")
     else:
-        query.edit_message_text(f"❌ No se pudieron borrar las valoraciones. Por favor, inténtalo de nuevo.")
+        await edit_message(query, f"❌ No se pudieron borrar las valoraciones. Por favor, inténtalo de nuevo.")
     
     return ConversationHandler.END
 
-def cancel(update: Update, context: CallbackContext) -> int:
+def _clear_conversation_data(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop the user_data keys left behind by an unfinished conversation."""
+    for key in _CONVERSATION_KEYS:
+        context.user_data.pop(key, None)
+
+async def conversation_timeout(update: object, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Clean up after a conversation that was abandoned for CONVERSATION_TIMEOUT seconds."""
+    _clear_conversation_data(context)
+    return ConversationHandler.END
+
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the current conversation."""
-    update.message.reply_text(
+    _clear_conversation_data(context)
+    await update.message.reply_text(
         "Operación cancelada. ¿Qué más te gustaría hacer?"
     )
     return ConversationHandler.END
+
+async def cancel_delete(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Cancel a deletion from the "No" button of its confirmation."""
+    query = update.callback_query
+    await query.answer()
+    
+    _clear_conversation_data(context)
+    await edit_message(query, "Operación cancelada. No se ha eliminado nada.")
+    return ConversationHandler.END
+    
+def setup_handlers(application: Application) -> None:
+    """Set up the Telegram bot handlers on an existing application."""
+    # Create the data store here rather than at import, so importing this module
+    # stays cheap; set DATA_STORE_PATH to persist it to SQLite
+    bot_data = application.bot_data
+    if "data_store" not in bot_data:
+        bot_data["data_store"] = DataStore(cached_env("DATA_STORE_PATH"))
+    for name in _STORE_CACHES:
+        bot_data.setdefault(name, TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL))
     
-def setup_handlers(dispatcher):
-    """Set up the Telegram bot handlers on an existing dispatcher."""
     # Basic command handlers
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help_command))
-    dispatcher.add_handler(CommandHandler("lists", show_lists))
-    
-    # Create list conversation
-    create_list_handler = ConversationHandler(
-        entry_points=[CommandHandler("newlist", new_list)],
-        states={
-            CREATE_LIST: [MessageHandler(Filters.text & ~Filters.command, create_list)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(create_list_handler)
-    
-    # Add item conversation
-    add_item_handler = ConversationHandler(
-        entry_points=[CommandHandler("additem", add_item_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(select_list_for_item, pattern=r"^add_to_")],
-            ADD_ITEM: [MessageHandler(Filters.text & ~Filters.command, add_item_to_list)],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(add_item_handler)
-    
-    # View list conversation
-    view_list_handler = ConversationHandler(
-        entry_points=[CommandHandler("viewlist", view_list_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(view_list_items, pattern=r"^view_")],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(view_list_handler)
-    
-    # Rate item conversation
-    rate_item_handler = ConversationHandler(
-        entry_points=[CommandHandler("rate", rate_item_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(select_list_for_rating, pattern=r"^rate_list_")],
-            SELECTING_ITEM_TO_RATE: [CallbackQueryHandler(select_item_for_rating, pattern=r"^rate_item_")],
-            RATE_ITEM: [CallbackQueryHandler(apply_rating, pattern=r"^give_rating_")],
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("lists", show_lists))
+    
+    # Keep the admin cache in sync with role changes
+    application.add_handler(ChatMemberHandler(chat_member_updated, ChatMemberHandler.CHAT_MEMBER))
+    
+    # Text replies inside a conversation, and the "No" button of every confirmation
+    text_message = filters.TEXT & ~filters.COMMAND
+    cancel_delete_handler = CallbackQueryHandler(cancel_delete, pattern=r"^cancel_delete$")
+    
+    # One conversation per command: (command, entry point, states)
+    conversations = [
+        ("newlist", new_list, {
+            CREATE_LIST: [MessageHandler(text_message, create_list)],
+        }),
+        ("additem", add_item_start, {
+            SELECT_LIST: [CallbackQueryHandler(select_list_for_item, pattern=r"^add_to_\d+$")],
+            ADD_ITEM: [MessageHandler(text_message, add_item_to_list)],
+        }),
+        ("viewlist", view_list_start, {
+            SELECT_LIST: [CallbackQueryHandler(view_list_items, pattern=r"^view_\d+$")],
+        }),
+        ("rate", rate_item_start, {
+            SELECT_LIST: [CallbackQueryHandler(select_list_for_rating, pattern=r"^rate_list_\d+$")],
+            SELECTING_ITEM_TO_RATE: [CallbackQueryHandler(select_item_for_rating, pattern=r"^rate_item_\d+$")],
+            RATE_ITEM: [CallbackQueryHandler(apply_rating, pattern=r"^give_rating_\d+$")],
             ADD_COMMENT: [
-                MessageHandler(Filters.text & ~Filters.command, add_rating_comment),
+                MessageHandler(text_message, add_rating_comment),
                 CommandHandler("skip", skip_comment),
             ],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(rate_item_handler)
-    
-    # View ratings conversation
-    view_ratings_handler = ConversationHandler(
-        entry_points=[CommandHandler("ratings", view_ratings_start)],
-        states={
-            SELECT_LIST: [CallbackQueryHandler(view_list_ratings, pattern=r"^ratings_")],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(view_ratings_handler)
-    
-    # Delete list conversation
-    delete_list_handler = ConversationHandler(
-        entry_points=[CommandHandler("deletelist", delete_list_start)],
-        states={
-            DELETE_LIST: [CallbackQueryHandler(confirm_delete_list, pattern=r"^delete_list_")],
+        }),
+        ("ratings", view_ratings_start, {
+            SELECT_LIST: [CallbackQueryHandler(view_list_ratings, pattern=r"^ratings_\d+$")],
+        }),
+        ("deletelist", delete_list_start, {
+            DELETE_LIST: [CallbackQueryHandler(confirm_delete_list, pattern=r"^delete_list_\d+$")],
             CONFIRM_DELETE: [
                 CallbackQueryHandler(execute_delete_list, pattern=r"^confirm_delete_list$"),
-                CallbackQueryHandler(cancel, pattern=r"^cancel_delete$"),
+                cancel_delete_handler,
             ],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(delete_list_handler)
-    
-    # Delete item conversation
-    delete_item_handler = ConversationHandler(
-        entry_points=[CommandHandler("deleteitem", delete_item_start)],
-        states={
-            DELETE_ITEM: [CallbackQueryHandler(select_list_for_delete_item, pattern=r"^delete_item_list_")],
+        }),
+        ("deleteitem", delete_item_start, {
+            DELETE_ITEM: [CallbackQueryHandler(select_list_for_delete_item, pattern=r"^delete_item_list_\d+$")],
             CONFIRM_DELETE: [
-                CallbackQueryHandler(confirm_delete_item, pattern=r"^delete_item_"),
+                CallbackQueryHandler(confirm_delete_item, pattern=r"^delete_item_\d+$"),
                 CallbackQueryHandler(execute_delete_item, pattern=r"^confirm_delete_item$"),
-                CallbackQueryHandler(cancel, pattern=r"^cancel_delete$"),
+                cancel_delete_handler,
             ],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(delete_item_handler)
-    
-    # Delete rating conversation
-    delete_rating_handler = ConversationHandler(
-        entry_points=[CommandHandler("deleterating", delete_rating_start)],
-        states={
-            DELETE_RATING: [CallbackQueryHandler(select_list_for_delete_rating, pattern=r"^delete_rating_list_")],
+        }),
+        ("deleterating", delete_rating_start, {
+            DELETE_RATING: [CallbackQueryHandler(select_list_for_delete_rating, pattern=r"^delete_rating_list_\d+$")],
             CONFIRM_DELETE: [
-                CallbackQueryHandler(select_item_for_delete_rating, pattern=r"^delete_rating_item_"),
+                CallbackQueryHandler(select_item_for_delete_rating, pattern=r"^delete_rating_item_\d+$"),
                 CallbackQueryHandler(confirm_delete_rating, pattern=r"^delete_rating_\d+$"),
                 CallbackQueryHandler(execute_delete_rating, pattern=r"^confirm_delete_rating$"),
-                CallbackQueryHandler(cancel, pattern=r"^cancel_delete$"),
+                cancel_delete_handler,
             ],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(delete_rating_handler)
-    
-    # Clear ratings conversation
-    clear_ratings_handler = ConversationHandler(
-        entry_points=[CommandHandler("clearratings", clear_ratings_start)],
-        states={
-            DELETE_RATING: [CallbackQueryHandler(select_list_for_clear_ratings, pattern=r"^clear_ratings_list_")],
+        }),
+        ("clearratings", clear_ratings_start, {
+            DELETE_RATING: [CallbackQueryHandler(select_list_for_clear_ratings, pattern=r"^clear_ratings_list_\d+$")],
             CONFIRM_DELETE: [
-                CallbackQueryHandler(confirm_clear_ratings, pattern=r"^clear_ratings_item_"),
+                CallbackQueryHandler(confirm_clear_ratings, pattern=r"^clear_ratings_item_\d+$"),
                 CallbackQueryHandler(execute_clear_ratings, pattern=r"^confirm_clear_ratings$"),
-                CallbackQueryHandler(cancel, pattern=r"^cancel_delete$"),
+                cancel_delete_handler,
             ],
-        },
-        fallbacks=[CommandHandler("cancel", cancel)],
-    )
-    dispatcher.add_handler(clear_ratings_handler)
+        }),
+    ]
+    
+    # Every conversation shares the same fallbacks (/cancel, and Prev/Next in any
+    # list or item menu) and timeout handling; the conversation_timeout job is
+    # scheduled on the application's JobQueue
+    fallbacks = [
+        CommandHandler("cancel", cancel),
+        CallbackQueryHandler(turn_menu_page, pattern=MENU_PAGE_PATTERN),
+    ]
+    timeout_handlers = [TypeHandler(Update, conversation_timeout)]
+    application.add_handlers([
+        ConversationHandler(
+            entry_points=[CommandHandler(command, entry_point)],
+            states={**states, ConversationHandler.TIMEOUT: timeout_handlers},
+            fallbacks=fallbacks,
+            conversation_timeout=CONVERSATION_TIMEOUT,
+            name=f"{command}_conversation",
+        )
+        for command, entry_point, states in conversations
+    ])
     
     # Fallback for cancel command outside of conversation
-    dispatcher.add_handler(CommandHandler("cancel", cancel))
+    application.add_handler(CommandHandler("cancel", cancel))
     
     # Add fallback handler for unknown commands
-    dispatcher.add_handler(MessageHandler(Filters.command, help_command))
+    application.add_handler(MessageHandler(filters.COMMAND, help_command))
 
-def setup_bot():
+def setup_bot() -> Application:
     """Set up the Telegram bot with all handlers."""
-    # Create the Updater
+    # Create the Application
     token = os.environ.get('TELEGRAM_TOKEN')
     if not token:
         raise ValueError("No TELEGRAM_TOKEN environment variable found. Please set it and restart.")
     
-    updater = Updater(token, use_context=True)
-    dispatcher = updater.dispatcher
+    # Handle up to CONCURRENT_UPDATES updates at once so users don't wait on each other.
+    # The rate limiter paces outgoing requests to Telegram's flood limits (30/s
+    # overall, 20/min per group) and retries the ones that still get a 429.
+    application = (
+        ApplicationBuilder()
+        .token(token)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        .rate_limiter(AIORateLimiter(max_retries=RATE_LIMIT_RETRIES))
+        .build()
+    )
     
     # Set up all handlers
-    setup_handlers(dispatcher)
+    setup_handlers(application)
     
-    return updater
\ No newline at end of file
+    return application
@@ -0,0 +1,70 @@
+"""
+Small in-process caches shared by the bot handler modules.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class TTLCache:
+    """
+    Size-bounded mapping whose entries expire after a fixed time.
+    When the cache is full, the least recently used entry is evicted.
+    All access happens on the bot's event loop, so no locking is needed.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """
+        Get a cached value.
+
+        Args:
+            key: Cache key
+            default: Value returned when the key is missing or expired
+
+        Returns:
+            Any: The cached value, or the default
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+
+        value, expires = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return default
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: Cache key
+            value: Value to cache
+        """
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """
+        Drop a key from the cache if it is present.
+
+        Args:
+            key: Cache key
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry."""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,66 @@
+"""
+Single entry point for running the Telegram bot on its own, without the web app.
+The launcher scripts used by the "bot_app" workflow all delegate to main().
+"""
+import importlib
+import logging
+import os
+import sys
+import time
+
+# Configure logging before importing the bot modules
+from logging_setup import configure
+configure()
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before restarting the bot after it crashed
+RESTART_DELAY = 1.0
+
+def main(handlers: str = "bot_handlers_spanish") -> None:
+    """
+    Run the bot in standalone mode until it is stopped.
+    The bot uses a webhook when PUBLIC_URL is set and long polling otherwise;
+    if it stops with an error, it is restarted in the same process.
+
+    Args:
+        handlers: Name of the handler module providing setup_bot() and
+            run_bot(application, close_loop); bot_handlers, bot_handlers_new
+            and bot_handlers_spanish all do
+    """
+    # Keep app.py from starting a second copy of the bot
+    os.environ["BOT_ONLY_MODE"] = "1"
+    os.environ["WORKFLOW_NAME"] = "bot_app"
+
+    if 'TELEGRAM_TOKEN' not in os.environ:
+        logger.error("TELEGRAM_TOKEN environment variable is not set")
+        sys.exit(1)
+
+    # Import here, once the environment variables the module reads are set
+    bot_module = importlib.import_module(handlers)
+
+    logger.info("Starting the Telegram bot in standalone mode...")
+    try:
+        # Build the application once, so bot_data survives restarts
+        application = bot_module.setup_bot()
+    except Exception as e:
+        logger.error("Failed to start bot: %s", e)
+        sys.exit(1)
+
+    # run_bot returns normally on Ctrl+C or SIGTERM; any exception restarts it
+    try:
+        while True:
+            try:
+                logger.info("Bot started. Press Ctrl+C to stop.")
+                bot_module.run_bot(application, close_loop=False)
+                break
+            except Exception:
+                logger.exception("Bot stopped unexpectedly, restarting...")
+                time.sleep(RESTART_DELAY)
+    except KeyboardInterrupt:
+        # Ctrl+C while waiting to restart
+        pass
+
+    logger.info("Bot stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+Environment configuration shared by the bot and web application modules.
+"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+@lru_cache(maxsize=None)
+def cached_env(name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Read an environment variable once and reuse the value on later calls.
+    Launchers must set any variables they rely on before the modules that
+    read them are imported.
+
+    Args:
+        name: Name of the environment variable
+        default: Value returned when the variable is not set
+
+    Returns:
+        Optional[str]: Value of the variable, or the default
+    """
+    return os.environ.get(name, default)
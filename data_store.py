@@ -1,33 +1,247 @@
+import atexit
 import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from array import array
 from collections import defaultdict
 from typing import Dict, List, Optional, Tuple, Any
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class ItemRatings:
+    """
+    Ratings and comments for a single item, stored column-wise.
+    Rating values live in a compact array of signed bytes (0-10 fits in one
+    byte each) with the comments in a parallel list. Iterating yields
+    (rating, comment) tuples, so callers can treat it like a list of pairs.
+    A running total is kept so the average is available in constant time.
+    """
+    __slots__ = ("values", "comments", "total")
+    
+    def __init__(self):
+        self.values = array('b')
+        self.comments = []
+        self.total = 0
+    
+    def append(self, rating: int, comment: str = "") -> None:
+        """Add a rating and its comment."""
+        self.values.append(rating)
+        self.comments.append(comment)
+        self.total += rating
+    
+    def mean(self) -> Optional[float]:
+        """
+        Get the average rating.
+        
+        Returns:
+            Optional[float]: Average of the rating values, or None if there are none
+        """
+        if not self.values:
+            return None
+        return self.total / len(self.values)
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def __iter__(self):
+        return zip(self.values, self.comments)
+    
+    def __getitem__(self, index: int) -> Tuple[int, str]:
+        return self.values[index], self.comments[index]
+    
+    def __delitem__(self, index: int) -> None:
+        self.total -= self.values[index]
+        del self.values[index]
+        del self.comments[index]
+
+# SQLite schema for persisted data. Running totals and averages are only kept
+# in memory; _load rebuilds them from the ratings table. Databases created with
+# the older items.total/count columns still work, since both have defaults.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lists (
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (user_id, name)
+);
+CREATE TABLE IF NOT EXISTS items (
+    user_id INTEGER NOT NULL,
+    list_name TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    PRIMARY KEY (user_id, list_name, item_name)
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    list_name TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    comment TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS ratings_by_item ON ratings (user_id, list_name, item_name, id);
+"""
+
+# Statements used by DataStore; sqlite3 keeps them compiled in its statement cache
+_INSERT_LIST = "INSERT OR IGNORE INTO lists (user_id, name) VALUES (?, ?)"
+_INSERT_ITEM = "INSERT OR IGNORE INTO items (user_id, list_name, item_name) VALUES (?, ?, ?)"
+_INSERT_RATING = "INSERT INTO ratings (user_id, list_name, item_name, rating, comment) VALUES (?, ?, ?, ?, ?)"
+_DELETE_LIST = "DELETE FROM lists WHERE user_id = ? AND name = ?"
+_DELETE_LIST_ITEMS = "DELETE FROM items WHERE user_id = ? AND list_name = ?"
+_DELETE_LIST_RATINGS = "DELETE FROM ratings WHERE user_id = ? AND list_name = ?"
+_DELETE_ITEM = "DELETE FROM items WHERE user_id = ? AND list_name = ? AND item_name = ?"
+_DELETE_ITEM_RATINGS = "DELETE FROM ratings WHERE user_id = ? AND list_name = ? AND item_name = ?"
+_DELETE_RATING_AT = (
+    "DELETE FROM ratings WHERE id = ("
+    "SELECT id FROM ratings WHERE user_id = ? AND list_name = ? AND item_name = ? "
+    "ORDER BY id LIMIT 1 OFFSET ?)"
+)
+
+# Write-behind: the writer commits at most every FLUSH_INTERVAL seconds, or
+# sooner once FLUSH_BATCH_SIZE statements are waiting. Anything still queued
+# is written out when the process exits normally.
+FLUSH_INTERVAL = 3.0
+FLUSH_BATCH_SIZE = 1000
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open the SQLite database, creating the schema if needed.
+    
+    Args:
+        path: Path of the database file
+    
+    Returns:
+        sqlite3.Connection: Connection in WAL mode
+    """
+    conn = sqlite3.connect(path)
+    # WAL lets readers proceed during writes; NORMAL only syncs at checkpoints
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+class _SQLiteWriter:
+    """
+    Background thread applying DataStore mutations to a SQLite database.
+    Statements are queued by the caller and executed on the writer thread,
+    so handlers never wait on disk I/O. Statements are collected for up to
+    FLUSH_INTERVAL seconds and committed together.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="data-store-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+    
+    def execute(self, sql: str, params: tuple) -> None:
+        """Queue one statement for the writer thread."""
+        self._queue.put((sql, params, False))
+    
+    def executemany(self, sql: str, params: list) -> None:
+        """Queue one statement to run once per parameter tuple."""
+        self._queue.put((sql, params, True))
+    
+    def close(self) -> None:
+        """Write out everything still queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+    
+    def _run(self) -> None:
+        conn = connect(self.path)
+        try:
+            while True:
+                batch = [self._queue.get()]
+                # Keep collecting until the flush interval has passed, the batch
+                # is full or close() was called, so the batch shares one commit
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while batch[-1] is not None and len(batch) < FLUSH_BATCH_SIZE:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                
+                for statement in batch:
+                    if statement is None:
+                        conn.commit()
+                        return
+                    sql, params, many = statement
+                    try:
+                        if many:
+                            conn.executemany(sql, params)
+                        else:
+                            conn.execute(sql, params)
+                    except sqlite3.Error as e:
+                        logger.error("Failed to persist change %r: %s", sql, e)
+                conn.commit()
+        finally:
+            conn.close()
+
 class DataStore:
     """
     In-memory data storage for the Telegram bot.
-    Stores user lists and item ratings with comments.
+    Stores user lists and item ratings with comments. When a database path is
+    given, the data is loaded from SQLite at startup and every change is
+    written through to it in the background; reads are always served from
+    memory.
     
     Data structure:
     {
         user_id: {
             list_name: {
-                item_name: [(rating, comment)]
+                item_name: ItemRatings  # iterates as [(rating, comment)]
             }
         }
     }
     """
     
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Args:
+            db_path: SQLite database file to persist to, or None to keep data in memory only
+        """
         # Initialize empty data store
-        self.data = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        self.data = defaultdict(lambda: defaultdict(lambda: defaultdict(ItemRatings)))
+        self._writer = None
+        
+        if db_path:
+            self._load(db_path)
+            self._writer = _SQLiteWriter(db_path)
         logger.debug("DataStore initialized")
     
-    def create_list(self, user_id: str, list_name: str) -> None:
+    def _load(self, db_path: str) -> None:
+        """Fill the in-memory data from the database."""
+        conn = connect(db_path)
+        try:
+            for user_id, name in conn.execute("SELECT user_id, name FROM lists"):
+                self.data[user_id][sys.intern(name)] = defaultdict(ItemRatings)
+            for user_id, list_name, item_name in conn.execute("SELECT user_id, list_name, item_name FROM items"):
+                self.data[user_id][list_name][sys.intern(item_name)] = ItemRatings()
+            for user_id, list_name, item_name, rating, comment in conn.execute(
+                "SELECT user_id, list_name, item_name, rating, comment FROM ratings ORDER BY id"
+            ):
+                self.data[user_id][list_name][item_name].append(rating, comment)
+        finally:
+            conn.close()
+        logger.debug("Loaded data for %s users from %s", len(self.data), db_path)
+    
+    def _persist(self, sql: str, params: tuple) -> None:
+        """Write a change through to the database, if one is configured."""
+        if self._writer is not None:
+            self._writer.execute(sql, params)
+    
+    def _persist_many(self, sql: str, params: list) -> None:
+        """Write a statement applied to several rows through to the database, if one is configured."""
+        if self._writer is not None and params:
+            self._writer.executemany(sql, params)
+    
+    def create_list(self, user_id: int, list_name: str) -> None:
         """
         Create a new empty list for a user.
         
@@ -35,12 +249,17 @@ class DataStore:
             user_id: Telegram user ID
             list_name: Name of the list to create
         """
+        # Telegram user IDs are used as int keys, never their str form
+        assert isinstance(user_id, int)
         # Since we're using defaultdict, we only need to ensure it exists
         if list_name not in self.data[user_id]:
-            self.data[user_id][list_name] = defaultdict(list)
-            logger.debug(f"Created list '{list_name}' for user {user_id}")
+            # Many users pick the same names; interning stores each one once
+            list_name = sys.intern(list_name)
+            self.data[user_id][list_name] = defaultdict(ItemRatings)
+            self._persist(_INSERT_LIST, (user_id, list_name))
+            logger.debug("Created list '%s' for user %s", list_name, user_id)
     
-    def list_exists(self, user_id: str, list_name: str) -> bool:
+    def list_exists(self, user_id: int, list_name: str) -> bool:
         """
         Check if a list exists for a user.
         
@@ -51,9 +270,11 @@ class DataStore:
         Returns:
             bool: True if list exists, False otherwise
         """
-        return list_name in self.data[user_id]
+        # Read with get() so checking a user with no lists doesn't create an entry
+        lists = self.data.get(user_id)
+        return lists is not None and list_name in lists
     
-    def get_all_lists(self, user_id: str) -> List[str]:
+    def get_all_lists(self, user_id: int) -> List[str]:
         """
         Get all list names for a user.
         
@@ -63,9 +284,10 @@ class DataStore:
         Returns:
             List[str]: List of list names
         """
-        return list(self.data[user_id].keys())
+        lists = self.data.get(user_id)
+        return list(lists.keys()) if lists is not None else []
     
-    def add_item(self, user_id: str, list_name: str, item_name: str) -> None:
+    def add_item(self, user_id: int, list_name: str, item_name: str) -> None:
         """
         Add an item to a list.
         
@@ -80,10 +302,12 @@ class DataStore:
         
         # Add the item (with empty ratings list)
         if item_name not in self.data[user_id][list_name]:
-            self.data[user_id][list_name][item_name] = []
-            logger.debug(f"Added item '{item_name}' to list '{list_name}' for user {user_id}")
+            item_name = sys.intern(item_name)
+            self.data[user_id][list_name][item_name] = ItemRatings()
+            self._persist(_INSERT_ITEM, (user_id, list_name, item_name))
+            logger.debug("Added item '%s' to list '%s' for user %s", item_name, list_name, user_id)
     
-    def item_exists(self, user_id: str, list_name: str, item_name: str) -> bool:
+    def item_exists(self, user_id: int, list_name: str, item_name: str) -> bool:
         """
         Check if an item exists in a list.
         
@@ -95,9 +319,10 @@ class DataStore:
         Returns:
             bool: True if item exists, False otherwise
         """
-        return list_name in self.data[user_id] and item_name in self.data[user_id][list_name]
+        lists = self.data.get(user_id)
+        return lists is not None and list_name in lists and item_name in lists[list_name]
     
-    def get_list_items(self, user_id: str, list_name: str) -> Dict[str, List[Tuple[int, str]]]:
+    def get_list_items(self, user_id: int, list_name: str) -> Dict[str, ItemRatings]:
         """
         Get all items and their ratings from a list.
         
@@ -106,14 +331,14 @@ class DataStore:
             list_name: Name of the list
             
         Returns:
-            Dict[str, List[Tuple[int, str]]]: Dictionary of item names to ratings and comments
+            Dict[str, ItemRatings]: Dictionary of item names to ratings and comments
         """
         if not self.list_exists(user_id, list_name):
             return {}
         
         return dict(self.data[user_id][list_name])
     
-    def add_rating(self, user_id: str, list_name: str, item_name: str, rating: int, comment: str = "") -> None:
+    def add_rating(self, user_id: int, list_name: str, item_name: str, rating: int, comment: str = "") -> None:
         """
         Add a rating with an optional comment to an item.
         
@@ -125,19 +350,20 @@ class DataStore:
             comment: Optional comment for the rating
         """
         if not self.item_exists(user_id, list_name, item_name):
-            logger.warning(f"Attempted to rate non-existent item '{item_name}' in list '{list_name}'")
+            logger.warning("Attempted to rate non-existent item '%s' in list '%s'", item_name, list_name)
             return
         
         # Validate rating
         if not (0 <= rating <= 10):
-            logger.warning(f"Invalid rating value: {rating}. Must be between 0 and 10.")
+            logger.warning("Invalid rating value: %s. Must be between 0 and 10.", rating)
             return
         
         # Add the rating with comment
-        self.data[user_id][list_name][item_name].append((rating, comment))
-        logger.debug(f"Added rating {rating} with comment '{comment}' to item '{item_name}' in list '{list_name}' for user {user_id}")
+        self.data[user_id][list_name][item_name].append(rating, comment)
+        self._persist(_INSERT_RATING, (user_id, list_name, item_name, rating, comment))
+        logger.debug("Added rating %s with comment '%s' to item '%s' in list '%s' for user %s", rating, comment, item_name, list_name, user_id)
     
-    def get_item_ratings(self, user_id: str, list_name: str, item_name: str) -> List[Tuple[int, str]]:
+    def get_item_ratings(self, user_id: int, list_name: str, item_name: str) -> ItemRatings:
         """
         Get all ratings and comments for an item.
         
@@ -147,14 +373,14 @@ class DataStore:
             item_name: Name of the item
             
         Returns:
-            List[Tuple[int, str]]: List of ratings and comments for the item
+            ItemRatings: Ratings and comments for the item
         """
         if not self.item_exists(user_id, list_name, item_name):
-            return []
+            return ItemRatings()
         
         return self.data[user_id][list_name][item_name]
         
-    def get_average_rating(self, user_id: str, list_name: str, item_name: str) -> float:
+    def get_average_rating(self, user_id: int, list_name: str, item_name: str) -> float:
         """
         Get the average rating for an item.
         
@@ -166,15 +392,28 @@ class DataStore:
         Returns:
             float: Average rating for the item or 0 if no ratings
         """
-        ratings = self.get_item_ratings(user_id, list_name, item_name)
-        if not ratings:
+        if not self.item_exists(user_id, list_name, item_name):
             return 0
+        
+        return self.data[user_id][list_name][item_name].mean() or 0
+        
+    def get_items_with_averages(self, user_id: int, list_name: str) -> List[Tuple[str, Optional[float], int]]:
+        """
+        Get every item in a list with its average rating and rating count.
+        
+        Args:
+            user_id: Telegram user ID
+            list_name: Name of the list
             
-        # Extract just the rating values (first item in each tuple)
-        rating_values = [r[0] for r in ratings]
-        return sum(rating_values) / len(rating_values)
+        Returns:
+            List[Tuple[str, Optional[float], int]]: (item name, average or None if unrated, count) per item
+        """
+        if not self.list_exists(user_id, list_name):
+            return []
         
-    def delete_list(self, user_id: str, list_name: str) -> bool:
+        return [(name, ratings.mean(), len(ratings)) for name, ratings in self.data[user_id][list_name].items()]
+        
+    def delete_list(self, user_id: int, list_name: str) -> bool:
         """
         Delete a list and all its items.
         
@@ -188,11 +427,18 @@ class DataStore:
         if not self.list_exists(user_id, list_name):
             return False
             
-        del self.data[user_id][list_name]
-        logger.debug(f"Deleted list '{list_name}' for user {user_id}")
+        lists = self.data[user_id]
+        del lists[list_name]
+        # Drop the user entirely once their last list is gone
+        if not lists:
+            del self.data[user_id]
+        self._persist(_DELETE_LIST_RATINGS, (user_id, list_name))
+        self._persist(_DELETE_LIST_ITEMS, (user_id, list_name))
+        self._persist(_DELETE_LIST, (user_id, list_name))
+        logger.debug("Deleted list '%s' for user %s", list_name, user_id)
         return True
         
-    def delete_item(self, user_id: str, list_name: str, item_name: str) -> bool:
+    def delete_item(self, user_id: int, list_name: str, item_name: str) -> bool:
         """
         Delete an item from a list.
         
@@ -208,10 +454,12 @@ class DataStore:
             return False
             
         del self.data[user_id][list_name][item_name]
-        logger.debug(f"Deleted item '{item_name}' from list '{list_name}' for user {user_id}")
+        self._persist(_DELETE_ITEM_RATINGS, (user_id, list_name, item_name))
+        self._persist(_DELETE_ITEM, (user_id, list_name, item_name))
+        logger.debug("Deleted item '%s' from list '%s' for user %s", item_name, list_name, user_id)
         return True
         
-    def delete_rating(self, user_id: str, list_name: str, item_name: str, rating_index: int) -> bool:
+    def delete_rating(self, user_id: int, list_name: str, item_name: str, rating_index: int) -> bool:
         """
         Delete a specific rating from an item.
         
@@ -232,10 +480,11 @@ class DataStore:
             return False
             
         del ratings[rating_index]
-        logger.debug(f"Deleted rating at index {rating_index} from item '{item_name}' in list '{list_name}' for user {user_id}")
+        self._persist(_DELETE_RATING_AT, (user_id, list_name, item_name, rating_index))
+        logger.debug("Deleted rating at index %s from item '%s' in list '%s' for user %s", rating_index, item_name, list_name, user_id)
         return True
         
-    def clear_ratings(self, user_id: str, list_name: str, item_name: str) -> bool:
+    def clear_ratings(self, user_id: int, list_name: str, item_name: str) -> bool:
         """
         Clear all ratings for an item.
         
@@ -250,6 +499,31 @@ class DataStore:
         if not self.item_exists(user_id, list_name, item_name):
             return False
             
-        self.data[user_id][list_name][item_name] = []
-        logger.debug(f"Cleared all ratings for item '{item_name}' in list '{list_name}' for user {user_id}")
+        self.data[user_id][list_name][item_name] = ItemRatings()
+        self._persist(_DELETE_ITEM_RATINGS, (user_id, list_name, item_name))
+        logger.debug("Cleared all ratings for item '%s' in list '%s' for user %s", item_name, list_name, user_id)
         return True
+    
+    def clear_ratings_bulk(self, user_id: int, list_name: str, item_names: List[str]) -> int:
+        """
+        Clear all ratings for several items of a list in one operation.
+        
+        Args:
+            user_id: Telegram user ID
+            list_name: Name of the list
+            item_names: Names of the items to clear
+            
+        Returns:
+            int: Number of items whose ratings were cleared; missing items are skipped
+        """
+        if not self.list_exists(user_id, list_name):
+            return 0
+        
+        items = self.data[user_id][list_name]
+        cleared = [(user_id, list_name, item_name) for item_name in item_names if item_name in items]
+        for _, _, item_name in cleared:
+            items[item_name] = ItemRatings()
+        
+        self._persist_many(_DELETE_ITEM_RATINGS, cleared)
+        logger.debug("Cleared all ratings for %s items in list '%s' for user %s", len(cleared), list_name, user_id)
+        return len(cleared)
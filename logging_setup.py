@@ -0,0 +1,47 @@
+"""
+Shared logging configuration for the bot and the web application.
+
+Log records are put on an in-memory queue by the calling thread and written
+out by a background QueueListener thread, so handlers never block on
+stderr/file I/O while processing Telegram updates or web requests.
+"""
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Union
+
+from config import cached_env
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Background listener that owns the real output handlers
+_listener = None
+
+def configure(level: Optional[Union[int, str]] = None) -> None:
+    """
+    Route all logging through a QueueHandler drained by a background thread.
+    Calling it again after the first time has no effect.
+
+    Args:
+        level: Level to set on the root logger; defaults to the LOG_LEVEL
+            environment variable, or INFO if that is not set
+    """
+    global _listener
+
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level if level is not None else cached_env("LOG_LEVEL", "INFO").upper())
+
+    _listener.start()
+    # Flush pending records on interpreter exit
+    atexit.register(_listener.stop)
@@ -1,30 +1,8 @@
 """
 Main entry point for the bot_app workflow.
-Uses the standalone bot script to avoid conflicts with Flask.
+Runs the standalone bot without Flask; see cli.main.
+The bot starts as soon as this module is imported or run, as it always has.
 """
-import os
-import sys
-import logging
+from cli import main
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG,
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
-
-# Set environment variables to force bot-only mode
-os.environ["BOT_ONLY_MODE"] = "1"
-os.environ["WORKFLOW_NAME"] = "bot_app"
-
-# Check if the token exists
-if 'TELEGRAM_TOKEN' not in os.environ:
-    logger.error("TELEGRAM_TOKEN environment variable is not set")
-    sys.exit(1)
-
-# Import and run the standalone bot
-try:
-    from bot_standalone import main
-    logger.info("Starting bot from bot_app workflow...")
-    main()
-except Exception as e:
-    logger.error(f"Failed to start bot in workflow: {e}")
-    sys.exit(1)
\ No newline at end of file
+main()